@@ -2,25 +2,78 @@
 Chat endpoints for interacting with agents
 """
 
-from fastapi import APIRouter, HTTPException
-from typing import Dict, Optional
-import uuid
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from cachetools import TTLCache
+import asyncio
+import msgspec
+import secrets
 from loguru import logger
 
-from app.models import ChatRequest, ChatResponse
+from app.config import settings
+from app.models import ChatRequest, ChatResponse, ChatResponseMsg
+from app.core.cache import ExactResponseCache, SemanticResponseCache
 from app.core.orchestrator import AgentOrchestrator
 from app.core.rag_system import RAGSystem
 from app.core.vector_store import VectorStoreManager
 
 router = APIRouter()
 
-# Store active orchestrators by conversation ID
-orchestrators: Dict[str, AgentOrchestrator] = {}
+
+class OrchestratorCache(TTLCache):
+    """TTL cache that releases agent histories of evicted orchestrators"""
+    
+    def popitem(self):
+        key, orchestrator = super().popitem()
+        orchestrator.reset()
+        return key, orchestrator
+    
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for _, orchestrator in expired:
+            orchestrator.reset()
+        return expired
+
+
+# Store active orchestrators by conversation ID, bounded in size and idle time
+orchestrators = OrchestratorCache(
+    maxsize=settings.ORCHESTRATOR_CACHE_SIZE,
+    ttl=settings.ORCHESTRATOR_CACHE_TTL
+)
+_orchestrators_lock = asyncio.Lock()
+
+# Responses are built as msgspec structs and encoded without pydantic validation
+_json_encoder = msgspec.json.Encoder()
+
+
+def _json_response(response: ChatResponseMsg) -> Response:
+    return Response(content=_json_encoder.encode(response), media_type="application/json")
 
 # Singleton RAG system instance
 _rag_system: Optional[RAGSystem] = None
 _rag_initialized: bool = False
 
+# Responses for exact repeats (Redis) and near-duplicate prompts (in-memory)
+exact_cache = ExactResponseCache(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    db=settings.REDIS_DB,
+    ttl=settings.EXACT_CACHE_TTL
+)
+response_cache = SemanticResponseCache(
+    similarity_threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    max_size=settings.SEMANTIC_CACHE_MAX_SIZE,
+    ttl=settings.SEMANTIC_CACHE_TTL
+)
+
+
+def set_rag_system(rag_system: RAGSystem):
+    """Use an already initialized RAG system, e.g. the one built at startup"""
+    global _rag_system, _rag_initialized
+    _rag_system = rag_system
+    _rag_initialized = True
+
 
 async def get_rag_system() -> RAGSystem:
     """Get or create the RAG system singleton"""
@@ -30,6 +83,8 @@ async def get_rag_system() -> RAGSystem:
         vector_store = VectorStoreManager()
         await vector_store.initialize()
         _rag_system = RAGSystem(vector_store=vector_store)
+        if settings.CAG_ENABLE:
+            await _rag_system.load_cag_context()
         _rag_initialized = True
         logger.info("RAG system initialized successfully")
     return _rag_system
@@ -40,18 +95,23 @@ async def get_orchestrator(
     rag_system: RAGSystem = None
 ) -> AgentOrchestrator:
     """Get or create an orchestrator for a conversation"""
-    if conversation_id and conversation_id in orchestrators:
-        return orchestrators[conversation_id]
-    
-    # Create new orchestrator with RAG system
-    if rag_system is None:
-        rag_system = await get_rag_system()
-    
-    orchestrator = AgentOrchestrator(rag_system=rag_system)
-    if conversation_id:
-        orchestrators[conversation_id] = orchestrator
-    
-    return orchestrator
+    async with _orchestrators_lock:
+        if conversation_id:
+            orchestrator = orchestrators.get(conversation_id)
+            if orchestrator is not None:
+                # Re-insert to restart the idle timer
+                orchestrators[conversation_id] = orchestrator
+                return orchestrator
+        
+        # Create new orchestrator with RAG system
+        if rag_system is None:
+            rag_system = await get_rag_system()
+        
+        orchestrator = AgentOrchestrator(rag_system=rag_system)
+        if conversation_id:
+            orchestrators[conversation_id] = orchestrator
+        
+        return orchestrator
 
 
 @router.post("/chat", response_model=ChatResponse)
@@ -67,18 +127,51 @@ async def chat(request: ChatRequest):
     """
     try:
         # Generate conversation ID if not provided
-        conversation_id = request.conversation_id or str(uuid.uuid4())
+        conversation_id = request.conversation_id or secrets.token_hex(16)
         
         logger.info(f"Processing chat request for conversation {conversation_id}")
         logger.info(f"RAG enabled: {request.use_rag}")
         
+        model = request.model or settings.DEFAULT_MODEL
+        
         # Get orchestrator with RAG system
         orchestrator = await get_orchestrator(conversation_id)
         
+        # Cached responses only stand in for a conversation's first turn; later
+        # turns depend on the conversation's history
+        use_cache = not orchestrator.has_history()
+        
+        # Serve exact repeats from Redis
+        exact_key = None
+        if settings.EXACT_CACHE_ENABLED and use_cache:
+            exact_key = exact_cache.make_key(
+                request.message, request.use_rag, model, settings.APP_VERSION
+            )
+            cached = await exact_cache.get(exact_key)
+            if cached is not None:
+                logger.info(f"Exact cache hit for conversation {conversation_id}")
+                orchestrator.remember_turn(request.message, cached["response"])
+                cached["conversation_id"] = conversation_id
+                return _json_response(msgspec.convert(cached, ChatResponseMsg))
+        
+        # Serve near-duplicate prompts from the semantic cache
+        cache_namespace = (request.use_rag, model)
+        embedding = None
+        if settings.SEMANTIC_CACHE_ENABLED and use_cache:
+            rag_system = await get_rag_system()
+            embedding = await rag_system.vector_store.embed(request.message)
+            cached = response_cache.get(cache_namespace, embedding)
+            if cached is not None:
+                logger.info(f"Semantic cache hit for conversation {conversation_id}")
+                orchestrator.remember_turn(request.message, cached.response)
+                return _json_response(
+                    msgspec.structs.replace(cached, conversation_id=conversation_id)
+                )
+        
         # Execute task
         result = await orchestrator.execute_task(request)
         
-        return ChatResponse(
+        response = ChatResponseMsg(
             response=result["response"],
             conversation_id=conversation_id,
             agent_trace=result["agent_trace"],
@@ -86,16 +179,51 @@ async def chat(request: ChatRequest):
             execution_time=result["execution_time"]
         )
         
+        if exact_key is not None:
+            await exact_cache.set(exact_key, msgspec.to_builtins(response))
+        if embedding is not None:
+            response_cache.put(cache_namespace, embedding, response)
+        
+        return _json_response(response)
+        
     except Exception as e:
         logger.error(f"Chat request failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming chat endpoint using server-sent events
+    
+    Each event carries a JSON object: {"delta": text} while the response is
+    generated, then a final event with conversation_id, agent_trace, sources
+    and execution_time. Failures are reported as an "error" event.
+    """
+    conversation_id = request.conversation_id or secrets.token_hex(16)
+    logger.info(f"Processing streaming chat request for conversation {conversation_id}")
+    
+    orchestrator = await get_orchestrator(conversation_id)
+    
+    async def event_stream():
+        try:
+            async for event in orchestrator.execute_task_stream(request):
+                if "delta" not in event:
+                    event["conversation_id"] = conversation_id
+                yield f"data: {_json_encoder.encode(event).decode()}\n\n"
+        except Exception as e:
+            logger.error(f"Streaming chat request failed: {e}")
+            yield f"event: error\ndata: {_json_encoder.encode({'detail': str(e)}).decode()}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @router.post("/chat/reset/{conversation_id}")
 async def reset_conversation(conversation_id: str):
     """Reset a conversation"""
-    if conversation_id in orchestrators:
-        orchestrators[conversation_id].reset()
+    orchestrator = orchestrators.get(conversation_id)
+    if orchestrator is not None:
+        orchestrator.reset()
         return {"status": "reset", "conversation_id": conversation_id}
     return {"status": "not_found", "conversation_id": conversation_id}
 
@@ -103,8 +231,9 @@ async def reset_conversation(conversation_id: str):
 @router.delete("/chat/{conversation_id}")
 async def delete_conversation(conversation_id: str):
     """Delete a conversation"""
-    if conversation_id in orchestrators:
-        del orchestrators[conversation_id]
+    orchestrator = orchestrators.pop(conversation_id, None)
+    if orchestrator is not None:
+        orchestrator.reset()
         return {"status": "deleted", "conversation_id": conversation_id}
     return {"status": "not_found", "conversation_id": conversation_id}
 
@@ -2,18 +2,23 @@
 Tool execution endpoints
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from app.models import CodeExecutionRequest, CodeExecutionResult
-from app.core.tools import execute_tool, AVAILABLE_TOOLS
+from app.core.tools import CodeExecutor, execute_tool, AVAILABLE_TOOLS
 from typing import Dict, Any
+import orjson
 
 router = APIRouter()
 
 
-@router.get("/tools")
-async def list_tools():
-    """List all available tools"""
-    return {
+# Encoded /tools response, built once since the tool set is static
+_TOOLS_JSON: bytes = b""
+
+
+def refresh_tools_json():
+    """Re-encode the tool listing; call after changing AVAILABLE_TOOLS"""
+    global _TOOLS_JSON
+    _TOOLS_JSON = orjson.dumps({
         "tools": [
             {
                 "name": tool["function"]["name"],
@@ -22,11 +27,20 @@ async def list_tools():
             }
             for tool in AVAILABLE_TOOLS
         ]
-    }
+    })
+
+
+refresh_tools_json()
+
+
+@router.get("/tools")
+async def list_tools():
+    """List all available tools"""
+    return Response(content=_TOOLS_JSON, media_type="application/json")
 
 
 @router.post("/tools/execute")
-async def execute_tool_endpoint(tool_name: str, arguments: Dict[str, Any]):
+async def execute_tool_endpoint(tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
     """Execute a tool"""
     try:
         result = await execute_tool(tool_name, arguments)
@@ -39,12 +53,8 @@ async def execute_tool_endpoint(tool_name: str, arguments: Dict[str, Any]):
 async def execute_code(request: CodeExecutionRequest):
     """Execute code safely"""
     try:
-        from app.core.tools import CodeExecutor
-        
-        executor = CodeExecutor()
-        
         if request.language == "python":
-            result = await executor.execute_python(request.code, request.timeout)
+            result = await CodeExecutor.execute_python(request.code, request.timeout)
         else:
             raise HTTPException(
                 status_code=400,
@@ -23,16 +23,61 @@ class Settings(BaseSettings):
     # Vector Database
     CHROMA_PERSIST_DIR: str = "./data/chroma"
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_ONNX_FILE: str = ""
+    VECTOR_QUERY_BATCH_WINDOW_MS: float = 5.0
+    EMBEDDING_CACHE_SIZE: int = 1024
+    IN_MEMORY_INDEX_MAX_DOCS: int = 100_000
+    IN_MEMORY_INDEX_DTYPE: str = "float32"
+    IN_MEMORY_INDEX_INT8: bool = False
+    FAISS_MIN_DOCS: int = 10_000
+    FAISS_NLIST: int = 64
+    FAISS_PQ_M: int = 16
+    FAISS_NPROBE: int = 8
+    EMBEDDING_DISK_CACHE_DIR: str = "./data/embedding_cache"
+    EMBEDDING_FUZZY_THRESHOLD: float = 0.95
+    
+    # Cache-Augmented Generation
+    CAG_ENABLE: bool = False
+    CAG_MAX_TOKENS: int = 32000
     
     # Redis
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
     
+    # Conversations
+    ORCHESTRATOR_CACHE_SIZE: int = 1024
+    ORCHESTRATOR_CACHE_TTL: int = 1800
+    
+    # Response Cache
+    EXACT_CACHE_ENABLED: bool = True
+    EXACT_CACHE_TTL: int = 3600
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+    SEMANTIC_CACHE_MAX_SIZE: int = 1024
+    SEMANTIC_CACHE_TTL: int = 3600
+    RAG_CACHE_ENABLED: bool = True
+    RAG_CACHE_THRESHOLD: float = 0.95
+    RAG_CACHE_MAX_SIZE: int = 256
+    RAG_CACHE_TTL: int = 600
+    
     # LLM Settings
     DEFAULT_MODEL: str = "gpt-4o"
     DEFAULT_TEMPERATURE: float = 0.7
     MAX_TOKENS: int = 2000
+    LLM_TIMEOUT: float = 120.0
+    LLM_MAX_CONNECTIONS: int = 200
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 100
+    
+    # Agent Memory
+    AGENT_HISTORY_MAX_MESSAGES: int = 20
+    AGENT_HISTORY_SUMMARY_BATCH: int = 10
+    
+    # Code Execution
+    CODE_EXECUTOR_WORKERS: int = 2
+    CODE_EXECUTOR_MEMORY_MB: int = 256
     
     # Security
     SECRET_KEY: str = "dev-secret-key-change-in-production"
@@ -2,17 +2,29 @@
 Agent Base Class and Specialized Agents
 """
 
-from typing import List, Dict, Any, Optional
-from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, Callable, Deque
+from abc import ABC
+from collections import deque
+from datetime import datetime
+from functools import cached_property
 from loguru import logger
+import asyncio
+import re
 
+from app.config import settings
 from app.core.llm_provider import LLMProvider, get_llm_provider
 from app.models import AgentType, AgentStep
 
 
+_THINKING_RE = re.compile(r"thinking:[ \t]*([^\n]*)", re.IGNORECASE)
+
+
 class BaseAgent(ABC):
     """Base class for all agents"""
     
+    # Static system prompt, kept identical across calls so providers can cache it
+    SYSTEM_PROMPT: str = ""
+    
     def __init__(
         self,
         agent_type: AgentType,
@@ -22,17 +34,126 @@ class BaseAgent(ABC):
         self.agent_type = agent_type
         self.llm_provider = llm_provider or get_llm_provider()
         self.temperature = temperature
-        self.conversation_history: List[Dict[str, str]] = []
+        self.conversation_history: Deque[Dict[str, str]] = deque(
+            maxlen=settings.AGENT_HISTORY_MAX_MESSAGES
+        )
+        # Messages pushed out of the history, waiting to be summarized
+        self._evicted_messages: List[Dict[str, str]] = []
+        self._rolling_summary: Optional[str] = None
     
-    @abstractmethod
     def get_system_prompt(self) -> str:
         """Get the system prompt for this agent"""
-        pass
+        return self.SYSTEM_PROMPT
     
     def get_tools(self) -> List[Dict[str, Any]]:
         """Get available tools for this agent"""
         return []
     
+    @cached_property
+    def tools(self) -> List[Dict[str, Any]]:
+        """Tools for this agent, built once per instance"""
+        return self.get_tools()
+    
+    def _build_messages(self, task: str, context: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Build the message list for a task
+        
+        Shared context goes first so every agent working on the same request
+        sends an identical prompt prefix that the provider can cache.
+        """
+        messages = []
+        
+        # Add context if provided
+        if context:
+            messages.append({
+                "role": "system",
+                "content": f"Additional Context:\n{context}"
+            })
+        
+        messages.append({"role": "system", "content": self.get_system_prompt()})
+        
+        # Add summary of turns that no longer fit in the history
+        if self._rolling_summary:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of earlier conversation:\n{self._rolling_summary}"
+            })
+        
+        # Add conversation history
+        messages.extend(self.conversation_history)
+        
+        # Add current task
+        messages.append({"role": "user", "content": task})
+        return messages
+    
+    def _build_step(self, task: str, response: Dict[str, Any]) -> AgentStep:
+        """Record an LLM response in the history and wrap it in an AgentStep"""
+        # Extract output
+        output = response.get("content", "")
+        
+        # Handle tool calls
+        tools_used = [tool_call.name for tool_call in response.get("tool_calls", ())]
+        
+        # Update conversation history
+        self.remember_exchange(task, output)
+        
+        return AgentStep(
+            agent_type=self.agent_type,
+            input=task,
+            output=output,
+            tools_used=tools_used,
+            thinking=self._extract_thinking(output),
+            timestamp=datetime.utcnow()
+        )
+    
+    @property
+    def has_history(self) -> bool:
+        """Whether earlier turns are in the history or its summary"""
+        return bool(self.conversation_history or self._evicted_messages or self._rolling_summary)
+    
+    def remember_exchange(self, task: str, output: str):
+        """Record a task and its answer in the history"""
+        self._remember({"role": "user", "content": task})
+        self._remember({"role": "assistant", "content": output})
+    
+    def _remember(self, message: Dict[str, str]):
+        """Append a message to the history, keeping any message it evicts"""
+        history = self.conversation_history
+        if history.maxlen is not None and len(history) == history.maxlen:
+            self._evicted_messages.append(history[0])
+        history.append(message)
+    
+    async def _maybe_summarize(self):
+        """Fold evicted messages into the rolling summary once enough have built up"""
+        if len(self._evicted_messages) < settings.AGENT_HISTORY_SUMMARY_BATCH:
+            return
+        
+        transcript = "\n\n".join(
+            f"{msg['role']}: {msg['content']}" for msg in self._evicted_messages
+        )
+        if self._rolling_summary:
+            transcript = f"Previous summary:\n{self._rolling_summary}\n\nNew messages:\n{transcript}"
+        
+        try:
+            response = await self.llm_provider.generate(
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "Summarize the conversation below in at most 200 tokens. "
+                                   "Keep decisions, requirements, code names and open questions."
+                    },
+                    {"role": "user", "content": transcript}
+                ],
+                temperature=0.0,
+                max_tokens=300
+            )
+        except Exception as e:
+            logger.warning(f"Agent {self.agent_type.value} history summarization failed: {e}")
+            return
+        
+        self._rolling_summary = response.get("content", "") or self._rolling_summary
+        self._evicted_messages = []
+    
     async def execute(
         self,
         task: str,
@@ -40,55 +161,17 @@ class BaseAgent(ABC):
     ) -> AgentStep:
         """Execute the agent's task"""
         try:
-            # Build messages
-            messages = [
-                {"role": "system", "content": self.get_system_prompt()}
-            ]
-            
-            # Add context if provided
-            if context:
-                messages.append({
-                    "role": "system",
-                    "content": f"Additional Context:\n{context}"
-                })
-            
-            # Add conversation history
-            messages.extend(self.conversation_history)
-            
-            # Add current task
-            messages.append({"role": "user", "content": task})
-            
-            # Get tools
-            tools = self.get_tools()
+            messages = self._build_messages(task, context)
             
             # Generate response
             response = await self.llm_provider.generate(
                 messages=messages,
                 temperature=self.temperature,
-                tools=tools if tools else None
+                tools=self.tools or None
             )
             
-            # Extract output
-            output = response.get("content", "")
-            
-            # Handle tool calls
-            tools_used = []
-            if "tool_calls" in response:
-                for tool_call in response["tool_calls"]:
-                    tools_used.append(tool_call["function"]["name"])
-            
-            # Update conversation history
-            self.conversation_history.append({"role": "user", "content": task})
-            self.conversation_history.append({"role": "assistant", "content": output})
-            
-            # Create agent step
-            step = AgentStep(
-                agent_type=self.agent_type,
-                input=task,
-                output=output,
-                tools_used=tools_used,
-                thinking=self._extract_thinking(output)
-            )
+            step = self._build_step(task, response)
+            await self._maybe_summarize()
             
             logger.info(f"{self.agent_type.value} completed task")
             return step
@@ -97,28 +180,99 @@ class BaseAgent(ABC):
             logger.error(f"Agent {self.agent_type.value} execution failed: {e}")
             raise
     
+    async def execute_stream(
+        self,
+        task: str,
+        context: Optional[str] = None,
+        on_complete: Optional[Callable[[AgentStep], Any]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Execute the agent's task, yielding output chunks as they arrive
+        
+        Args:
+            task: The task to execute
+            context: Optional additional context
+            on_complete: Called with the finished AgentStep
+        """
+        messages = self._build_messages(task, context)
+        chunks = []
+        
+        try:
+            async for chunk in self.llm_provider.generate_stream(
+                messages=messages,
+                temperature=self.temperature
+            ):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            logger.error(f"Agent {self.agent_type.value} streaming failed: {e}")
+            raise
+        
+        step = self._build_step(task, {"content": "".join(chunks)})
+        await self._maybe_summarize()
+        logger.info(f"{self.agent_type.value} completed task")
+        if on_complete:
+            on_complete(step)
+    
+    async def execute_parallel(
+        self,
+        tasks: List[Tuple[str, Optional[str]]]
+    ) -> List[AgentStep]:
+        """
+        Execute independent tasks concurrently
+        
+        Every task sees the history as it was before the batch; results are
+        appended to the history in task order once all calls have succeeded.
+        If any call fails, the first error is raised and nothing is recorded.
+        
+        Args:
+            tasks: List of (task, context) pairs
+            
+        Returns:
+            AgentSteps in the same order as the tasks
+        """
+        batch = [self._build_messages(task, context) for task, context in tasks]
+        
+        responses = await asyncio.gather(
+            *[
+                self.llm_provider.generate(
+                    messages=messages,
+                    temperature=self.temperature,
+                    tools=self.tools or None
+                )
+                for messages in batch
+            ],
+            return_exceptions=True
+        )
+        
+        # Leave the history untouched unless the whole batch succeeded
+        errors = [response for response in responses if isinstance(response, BaseException)]
+        if errors:
+            logger.error(f"Agent {self.agent_type.value} parallel execution failed: {errors[0]}")
+            raise errors[0]
+        
+        steps = [self._build_step(task, response) for (task, _), response in zip(tasks, responses)]
+        await self._maybe_summarize()
+        
+        logger.info(f"{self.agent_type.value} completed {len(steps)} tasks in parallel")
+        return steps
+    
     def _extract_thinking(self, output: str) -> Optional[str]:
         """Extract thinking/reasoning from output if present"""
-        # Simple extraction - can be improved
-        if "thinking:" in output.lower():
-            parts = output.split("thinking:", 1)
-            if len(parts) > 1:
-                return parts[1].split("\n")[0].strip()
-        return None
+        match = _THINKING_RE.search(output)
+        return match.group(1).strip() if match else None
     
     def reset_history(self):
         """Reset conversation history"""
-        self.conversation_history = []
+        self.conversation_history.clear()
+        self._evicted_messages = []
+        self._rolling_summary = None
 
 
 class PlannerAgent(BaseAgent):
     """Agent that plans and breaks down tasks"""
     
-    def __init__(self, **kwargs):
-        super().__init__(agent_type=AgentType.PLANNER, **kwargs)
-    
-    def get_system_prompt(self) -> str:
-        return """You are an expert Planning Agent specialized in breaking down complex coding tasks.
+    SYSTEM_PROMPT = """You are an expert Planning Agent specialized in breaking down complex coding tasks.
 
 Your responsibilities:
 1. Analyze the user's request and understand the full scope
@@ -134,16 +288,15 @@ Output Format:
 - Keep the plan clear and actionable
 
 Be thorough but concise. Focus on the logical flow of implementation."""
+    
+    def __init__(self, **kwargs):
+        super().__init__(agent_type=AgentType.PLANNER, **kwargs)
 
 
 class CoderAgent(BaseAgent):
     """Agent that writes code"""
     
-    def __init__(self, **kwargs):
-        super().__init__(agent_type=AgentType.CODER, temperature=0.3, **kwargs)
-    
-    def get_system_prompt(self) -> str:
-        return """You are an expert Coding Agent specialized in writing high-quality code.
+    SYSTEM_PROMPT = """You are an expert Coding Agent specialized in writing high-quality code.
 
 Your responsibilities:
 1. Write clean, efficient, and well-documented code
@@ -160,16 +313,15 @@ Guidelines:
 - Provide complete implementations, not placeholders
 
 Output your code in markdown code blocks with the appropriate language tag."""
+    
+    def __init__(self, **kwargs):
+        super().__init__(agent_type=AgentType.CODER, temperature=0.3, **kwargs)
 
 
 class ReviewerAgent(BaseAgent):
     """Agent that reviews code"""
     
-    def __init__(self, **kwargs):
-        super().__init__(agent_type=AgentType.REVIEWER, **kwargs)
-    
-    def get_system_prompt(self) -> str:
-        return """You are an expert Code Reviewer Agent specialized in identifying issues and improvements.
+    SYSTEM_PROMPT = """You are an expert Code Reviewer Agent specialized in identifying issues and improvements.
 
 Your responsibilities:
 1. Review code for correctness and bugs
@@ -192,16 +344,15 @@ Output Format:
 - Provide specific line references when possible
 - Suggest concrete improvements
 - Highlight what's done well"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(agent_type=AgentType.REVIEWER, **kwargs)
 
 
 class DebuggerAgent(BaseAgent):
     """Agent that debugs code"""
     
-    def __init__(self, **kwargs):
-        super().__init__(agent_type=AgentType.DEBUGGER, **kwargs)
-    
-    def get_system_prompt(self) -> str:
-        return """You are an expert Debugging Agent specialized in identifying and fixing code issues.
+    SYSTEM_PROMPT = """You are an expert Debugging Agent specialized in identifying and fixing code issues.
 
 Your responsibilities:
 1. Analyze error messages and stack traces
@@ -219,16 +370,15 @@ Debugging Approach:
 6. Suggest how to prevent similar issues
 
 Be systematic and thorough in your analysis."""
+    
+    def __init__(self, **kwargs):
+        super().__init__(agent_type=AgentType.DEBUGGER, **kwargs)
 
 
 class OptimizerAgent(BaseAgent):
     """Agent that optimizes code"""
     
-    def __init__(self, **kwargs):
-        super().__init__(agent_type=AgentType.OPTIMIZER, **kwargs)
-    
-    def get_system_prompt(self) -> str:
-        return """You are an expert Code Optimizer Agent specialized in improving code performance.
+    SYSTEM_PROMPT = """You are an expert Code Optimizer Agent specialized in improving code performance.
 
 Your responsibilities:
 1. Identify performance bottlenecks
@@ -250,19 +400,23 @@ Always explain:
 - Why it's better
 - Any trade-offs involved
 - Expected performance improvement"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(agent_type=AgentType.OPTIMIZER, **kwargs)
+
+
+AGENT_CLASSES = {
+    AgentType.PLANNER: PlannerAgent,
+    AgentType.CODER: CoderAgent,
+    AgentType.REVIEWER: ReviewerAgent,
+    AgentType.DEBUGGER: DebuggerAgent,
+    AgentType.OPTIMIZER: OptimizerAgent
+}
 
 
 def create_agent(agent_type: AgentType, **kwargs) -> BaseAgent:
     """Factory function to create agents"""
-    agent_classes = {
-        AgentType.PLANNER: PlannerAgent,
-        AgentType.CODER: CoderAgent,
-        AgentType.REVIEWER: ReviewerAgent,
-        AgentType.DEBUGGER: DebuggerAgent,
-        AgentType.OPTIMIZER: OptimizerAgent
-    }
-    
-    agent_class = agent_classes.get(agent_type)
+    agent_class = AGENT_CLASSES.get(agent_type)
     if not agent_class:
         raise ValueError(f"Unknown agent type: {agent_type}")
     
@@ -0,0 +1,427 @@
+"""
+Caching utilities for chat responses
+"""
+
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+from collections import OrderedDict
+from loguru import logger
+import hashlib
+import itertools
+import os
+import pickle
+import re
+import threading
+import time
+
+import numpy as np
+import orjson
+
+try:
+    from blake3 import blake3
+except ImportError:
+    blake3 = hashlib.blake2b
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+try:
+    from datasketch import LeanMinHash, MinHash, MinHashLSH
+except ImportError:
+    LeanMinHash = MinHash = MinHashLSH = None
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    """Lowercase a prompt and collapse runs of whitespace"""
+    return _WHITESPACE_RE.sub(" ", text).strip().lower()
+
+
+class SemanticResponseCache:
+    """
+    In-memory cache that returns a stored response for near-duplicate prompts.
+    
+    Prompt embeddings are hashed with random-projection LSH into several bands;
+    a lookup only cosine-compares entries that share at least one bucket with the
+    query. Entries are evicted LRU-first once ``max_size`` is reached and expire
+    after ``ttl`` seconds.
+    """
+    
+    def __init__(
+        self,
+        similarity_threshold: float = 0.95,
+        num_bands: int = 8,
+        band_bits: int = 8,
+        max_size: int = 1024,
+        ttl: float = 3600,
+        seed: int = 0
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.num_bands = num_bands
+        self.band_bits = band_bits
+        self.max_size = max_size
+        self.ttl = ttl
+        self._rng = np.random.default_rng(seed)
+        self._planes: Optional[np.ndarray] = None
+        self._bit_weights = 1 << np.arange(band_bits, dtype=np.int64)
+        self._entries: "OrderedDict[int, Tuple[Hashable, np.ndarray, Any, float, List[int]]]" = OrderedDict()
+        self._buckets: List[Dict[Tuple[Hashable, int], Set[int]]] = [{} for _ in range(num_bands)]
+        self._ids = itertools.count()
+    
+    def _normalize(self, embedding: Any) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+    
+    def _band_keys(self, vec: np.ndarray) -> List[int]:
+        """Hash a vector into one bucket key per band"""
+        if self._planes is None:
+            self._planes = self._rng.standard_normal(
+                (self.num_bands, self.band_bits, vec.shape[0])
+            ).astype(np.float32)
+        bits = (self._planes @ vec) > 0
+        return (bits @ self._bit_weights).tolist()
+    
+    def _remove(self, entry_id: int):
+        namespace, _, _, _, keys = self._entries.pop(entry_id)
+        for band, key in zip(self._buckets, keys):
+            bucket = band.get((namespace, key))
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del band[(namespace, key)]
+    
+    def get(self, namespace: Hashable, embedding: Any) -> Optional[Any]:
+        """Return the cached value for the most similar prompt, if any"""
+        vec = self._normalize(embedding)
+        keys = self._band_keys(vec)
+        now = time.monotonic()
+        
+        candidates: Set[int] = set()
+        for band, key in zip(self._buckets, keys):
+            candidates |= band.get((namespace, key), set())
+        
+        best_id, best_score = None, self.similarity_threshold
+        for entry_id in candidates:
+            _, cached_vec, _, expires_at, _ = self._entries[entry_id]
+            if expires_at <= now:
+                self._remove(entry_id)
+                continue
+            score = float(cached_vec @ vec)
+            if score >= best_score:
+                best_id, best_score = entry_id, score
+        
+        if best_id is None:
+            return None
+        
+        self._entries.move_to_end(best_id)
+        return self._entries[best_id][2]
+    
+    def put(self, namespace: Hashable, embedding: Any, value: Any):
+        """Store a value for a prompt embedding"""
+        vec = self._normalize(embedding)
+        keys = self._band_keys(vec)
+        entry_id = next(self._ids)
+        
+        self._entries[entry_id] = (namespace, vec, value, time.monotonic() + self.ttl, keys)
+        for band, key in zip(self._buckets, keys):
+            band.setdefault((namespace, key), set()).add(entry_id)
+        
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+    
+    def clear(self):
+        """Drop all cached entries"""
+        self._entries.clear()
+        for band in self._buckets:
+            band.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SmartRAGCache:
+    """
+    Two-tier cache for RAG query results.
+    
+    Lookups first try an exact match on the normalized query and search
+    options, then fall back to the most similar cached query embedding (one
+    matrix-vector product over all entries) with the same options. Entries are
+    evicted LRU-first once ``max_size`` is reached and expire after ``ttl``
+    seconds.
+    """
+    
+    def __init__(
+        self,
+        similarity_threshold: float = 0.95,
+        max_size: int = 256,
+        ttl: float = 600
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[str, np.ndarray, Any, float]]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+        self._matrix_params: List[str] = []
+    
+    def make_keys(self, query: str, *options: Any) -> Tuple[str, str]:
+        """Build (exact key, options key) for a query and its search options"""
+        params = orjson.dumps(options, option=orjson.OPT_SORT_KEYS).decode()
+        payload = "\x1f".join([normalize_prompt(query), params])
+        return blake3(payload.encode("utf-8")).hexdigest(), params
+    
+    def _expire(self, key: str, expires_at: float) -> bool:
+        if expires_at > time.monotonic():
+            return False
+        del self._entries[key]
+        self._matrix = None
+        return True
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Return the value cached for an exact key"""
+        entry = self._entries.get(key)
+        if entry is None or self._expire(key, entry[3]):
+            return None
+        self._entries.move_to_end(key)
+        return entry[2]
+    
+    def get_similar(self, params: str, embedding: Any) -> Optional[Any]:
+        """Return the value cached for the most similar query with the same options"""
+        if not self._entries:
+            return None
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries)
+            self._matrix_params = [self._entries[key][0] for key in self._matrix_keys]
+            self._matrix = np.stack([self._entries[key][1] for key in self._matrix_keys])
+        
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        scores = self._matrix @ vec
+        for index in np.argsort(scores)[::-1]:
+            if scores[index] < self.similarity_threshold:
+                break
+            if self._matrix_params[index] == params:
+                value = self.get(self._matrix_keys[index])
+                if value is not None:
+                    return value
+        return None
+    
+    def put(self, key: str, params: str, embedding: Any, value: Any):
+        """Store a value under its exact key and normalized query embedding"""
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        self._entries[key] = (params, vec, value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._matrix = None
+    
+    def clear(self):
+        """Drop all cached entries"""
+        self._entries.clear()
+        self._matrix = None
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class EmbeddingCache:
+    """
+    On-disk cache of document embeddings keyed by content hash and model.
+    
+    Lets re-indexing skip the embedding model for documents it has already
+    seen. Documents that miss on the exact hash fall back to a MinHash LSH
+    index over character shingles, so near-duplicates (whitespace or other
+    trivial edits) reuse the embedding of a stored document whose estimated
+    Jaccard similarity is at least ``fuzzy_threshold``. Disabled when diskcache
+    is not installed or no directory is given; the fuzzy tier also needs
+    datasketch.
+    """
+    
+    def __init__(
+        self,
+        directory: str,
+        model_name: str,
+        fuzzy_threshold: float = 0.95,
+        num_perm: int = 128,
+        shingle_size: int = 5
+    ):
+        self.model_name = model_name
+        self.fuzzy_threshold = fuzzy_threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._cache = None
+        self._lsh = None
+        self._lsh_path = None
+        self._lsh_dirty = False
+        # Lookups and inserts run on the encoder thread, while save() runs on
+        # whichever thread closes the store, possibly mid-batch
+        self._lsh_lock = threading.Lock()
+        if diskcache is None or not directory:
+            return
+        
+        self._cache = diskcache.Cache(directory)
+        if MinHashLSH is not None and fuzzy_threshold:
+            self._lsh_path = os.path.join(directory, "lsh.pkl")
+            self._lsh = self._load_lsh()
+    
+    def _load_lsh(self):
+        try:
+            with open(self._lsh_path, "rb") as f:
+                lsh = pickle.load(f)
+            if lsh.h == self.num_perm:
+                return lsh
+        except (OSError, pickle.PickleError, EOFError, AttributeError) as e:
+            logger.debug(f"Starting a new embedding LSH index: {e}")
+        return MinHashLSH(threshold=self.fuzzy_threshold, num_perm=self.num_perm)
+    
+    def _minhash(self, content: str):
+        text = content.strip()
+        minhash = MinHash(num_perm=self.num_perm)
+        minhash.update_batch([
+            text[i:i + self.shingle_size].encode("utf-8")
+            for i in range(max(len(text) - self.shingle_size + 1, 1))
+        ])
+        return LeanMinHash(minhash)
+    
+    def make_key(self, content: str) -> str:
+        """Build a cache key from the stripped content and the model name"""
+        return hashlib.sha256(content.strip().encode("utf-8")).hexdigest() + ":" + self.model_name
+    
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Get a cached embedding, or None on miss"""
+        if self._cache is None:
+            return None
+        return self._cache.get(key)
+    
+    def get_similar(self, content: str) -> Optional[np.ndarray]:
+        """Get the embedding of a near-duplicate document, or None"""
+        if self._lsh is None:
+            return None
+        minhash = self._minhash(content)
+        with self._lsh_lock:
+            keys = self._lsh.query(minhash)
+        for key in keys:
+            if not key.endswith(":" + self.model_name):
+                continue
+            # LSH buckets can hold false positives, check the estimate itself
+            cached = self._cache.get(key + "#minhash")
+            if cached is None or minhash.jaccard(cached) < self.fuzzy_threshold:
+                continue
+            embedding = self._cache.get(key)
+            if embedding is not None:
+                return embedding
+        return None
+    
+    def put(self, key: str, embedding: Any, content: Optional[str] = None):
+        """Store an embedding, indexing its content for near-duplicate lookups"""
+        if self._cache is None:
+            return
+        self._cache.set(key, np.asarray(embedding, dtype=np.float32))
+        if self._lsh is not None and content is not None:
+            minhash = self._minhash(content)
+            with self._lsh_lock:
+                if key in self._lsh:
+                    return
+                self._cache.set(key + "#minhash", minhash)
+                self._lsh.insert(key, minhash)
+                self._lsh_dirty = True
+    
+    def find_uncached_texts(self, texts: List[str]) -> Tuple[List[Optional[np.ndarray]], List[int]]:
+        """Look up texts, returning the cached embeddings (None on miss) and the miss indices"""
+        embeddings = []
+        exact_hits = fuzzy_hits = 0
+        for text in texts:
+            embedding = self.get(self.make_key(text))
+            if embedding is not None:
+                exact_hits += 1
+            else:
+                embedding = self.get_similar(text)
+                fuzzy_hits += embedding is not None
+            embeddings.append(embedding)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        logger.debug(
+            f"Embedding cache: {exact_hits} exact hits, {fuzzy_hits} near-duplicate hits, "
+            f"{len(missing)} misses"
+        )
+        return embeddings, missing
+    
+    def save(self):
+        """Write the near-duplicate index next to the cached embeddings"""
+        if self._lsh is None:
+            return
+        with self._lsh_lock:
+            if not self._lsh_dirty:
+                return
+            tmp_path = self._lsh_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(self._lsh, f)
+            os.replace(tmp_path, self._lsh_path)
+            self._lsh_dirty = False
+    
+    def close(self):
+        """Save the near-duplicate index and close the underlying cache files"""
+        if self._cache is not None:
+            self.save()
+            self._cache.close()
+
+
+class ExactResponseCache:
+    """Redis-backed cache for exact repeats of a normalized prompt"""
+    
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6379,
+        db: int = 0,
+        ttl: int = 3600,
+        prefix: str = "chat:"
+    ):
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = None
+        if aioredis is not None:
+            self._client = aioredis.Redis(
+                host=host,
+                port=port,
+                db=db,
+                socket_connect_timeout=0.25,
+                socket_timeout=0.25
+            )
+    
+    def make_key(self, message: str, *parts: Any) -> str:
+        """Build a cache key from the normalized prompt and request options"""
+        payload = "\x1f".join([normalize_prompt(message), *map(str, parts)])
+        return self.prefix + blake3(payload.encode("utf-8")).hexdigest()
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached value, or None on miss or when Redis is unavailable"""
+        if self._client is None:
+            return None
+        try:
+            raw = await self._client.get(key)
+        except Exception as e:
+            logger.warning(f"Exact cache lookup failed: {e}")
+            return None
+        return orjson.loads(raw) if raw is not None else None
+    
+    async def set(self, key: str, value: Dict[str, Any]):
+        """Store a value with the configured TTL"""
+        if self._client is None:
+            return
+        try:
+            await self._client.setex(key, self.ttl, orjson.dumps(value))
+        except Exception as e:
+            logger.warning(f"Exact cache store failed: {e}")
+    
+    async def close(self):
+        """Close the Redis connection pool"""
+        if self._client is not None:
+            await self._client.aclose()
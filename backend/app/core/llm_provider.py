@@ -3,22 +3,67 @@ LLM Provider Interface
 Supports multiple LLM providers (OpenAI, Anthropic, etc.)
 """
 
-from typing import List, Dict, Any, Optional, AsyncIterator
+import asyncio
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple, Type
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from types import ModuleType
 from loguru import logger
 
 from app.config import settings
 
 try:
+    import openai
     from openai import AsyncOpenAI
 except ImportError:
+    openai = None
     AsyncOpenAI = None
 
 try:
+    import anthropic
     from anthropic import AsyncAnthropic
 except ImportError:
+    anthropic = None
     AsyncAnthropic = None
 
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def create_http_client(sdk: ModuleType) -> Any:
+    """Create a pooled HTTP client for an SDK, shared by all of its requests"""
+    # Use the SDK's own client and limits types so they match its httpx version
+    limits_cls = type(sdk.DEFAULT_CONNECTION_LIMITS)
+    return sdk.DefaultAsyncHttpxClient(
+        limits=limits_cls(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS
+        ),
+        http2=HTTP2_AVAILABLE,
+        timeout=settings.LLM_TIMEOUT
+    )
+
+
+@dataclass
+class ToolCall:
+    """Tool call requested by the model"""
+    __slots__ = ("id", "name", "arguments")
+    
+    id: str
+    name: str
+    arguments: str
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to the OpenAI tool call format"""
+        return {
+            "id": self.id,
+            "type": "function",
+            "function": {"name": self.name, "arguments": self.arguments}
+        }
+
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers"""
@@ -43,6 +88,10 @@ class LLMProvider(ABC):
     ) -> AsyncIterator[str]:
         """Generate streaming completion"""
         pass
+    
+    async def close(self):
+        """Release network resources held by the provider"""
+        pass
 
 
 class OpenAIProvider(LLMProvider):
@@ -52,9 +101,16 @@ class OpenAIProvider(LLMProvider):
         if AsyncOpenAI is None:
             raise ImportError("OpenAI package not installed")
         
-        self.client = AsyncOpenAI(api_key=api_key or settings.OPENAI_API_KEY)
+        self.client = AsyncOpenAI(
+            api_key=api_key or settings.OPENAI_API_KEY,
+            http_client=create_http_client(openai)
+        )
         self.model = model
     
+    async def close(self):
+        """Close the underlying HTTP client"""
+        await self.client.close()
+    
     async def generate(
         self,
         messages: List[Dict[str, str]],
@@ -88,14 +144,7 @@ class OpenAIProvider(LLMProvider):
             # Include tool calls if present
             if hasattr(message, 'tool_calls') and message.tool_calls:
                 result["tool_calls"] = [
-                    {
-                        "id": tc.id,
-                        "type": tc.type,
-                        "function": {
-                            "name": tc.function.name,
-                            "arguments": tc.function.arguments
-                        }
-                    }
+                    ToolCall(tc.id, tc.function.name, tc.function.arguments)
                     for tc in message.tool_calls
                 ]
             
@@ -130,6 +179,28 @@ class OpenAIProvider(LLMProvider):
             raise
 
 
+def _split_system(
+    messages: List[Dict[str, str]]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+    """Split messages into Anthropic system blocks and chat messages in one pass"""
+    system_blocks = []
+    chat_messages = []
+    
+    for msg in messages:
+        if msg["role"] == "system":
+            system_blocks.append({"type": "text", "text": msg["content"]})
+        else:
+            chat_messages.append(msg)
+    
+    if system_blocks:
+        # Cache the leading block (shared context, reused across agents) and
+        # the end of the static prefix
+        system_blocks[0]["cache_control"] = {"type": "ephemeral"}
+        system_blocks[-1]["cache_control"] = {"type": "ephemeral"}
+    
+    return system_blocks, chat_messages
+
+
 class AnthropicProvider(LLMProvider):
     """Anthropic Claude Provider"""
     
@@ -137,9 +208,16 @@ class AnthropicProvider(LLMProvider):
         if AsyncAnthropic is None:
             raise ImportError("Anthropic package not installed")
         
-        self.client = AsyncAnthropic(api_key=api_key or settings.ANTHROPIC_API_KEY)
+        self.client = AsyncAnthropic(
+            api_key=api_key or settings.ANTHROPIC_API_KEY,
+            http_client=create_http_client(anthropic)
+        )
         self.model = model
     
+    async def close(self):
+        """Close the underlying HTTP client"""
+        await self.client.close()
+    
     async def generate(
         self,
         messages: List[Dict[str, str]],
@@ -149,15 +227,7 @@ class AnthropicProvider(LLMProvider):
     ) -> Dict[str, Any]:
         """Generate completion using Anthropic"""
         try:
-            # Separate system messages
-            system_message = None
-            chat_messages = []
-            
-            for msg in messages:
-                if msg["role"] == "system":
-                    system_message = msg["content"]
-                else:
-                    chat_messages.append(msg)
+            system_blocks, chat_messages = _split_system(messages)
             
             kwargs = {
                 "model": self.model,
@@ -166,8 +236,8 @@ class AnthropicProvider(LLMProvider):
                 "max_tokens": max_tokens
             }
             
-            if system_message:
-                kwargs["system"] = system_message
+            if system_blocks:
+                kwargs["system"] = system_blocks
             
             if tools:
                 kwargs["tools"] = tools
@@ -182,14 +252,7 @@ class AnthropicProvider(LLMProvider):
                 if block.type == "text":
                     content += block.text
                 elif block.type == "tool_use":
-                    tool_calls.append({
-                        "id": block.id,
-                        "type": "function",
-                        "function": {
-                            "name": block.name,
-                            "arguments": str(block.input)
-                        }
-                    })
+                    tool_calls.append(ToolCall(block.id, block.name, str(block.input)))
             
             result = {
                 "content": content,
@@ -214,15 +277,7 @@ class AnthropicProvider(LLMProvider):
     ) -> AsyncIterator[str]:
         """Generate streaming completion"""
         try:
-            # Separate system messages
-            system_message = None
-            chat_messages = []
-            
-            for msg in messages:
-                if msg["role"] == "system":
-                    system_message = msg["content"]
-                else:
-                    chat_messages.append(msg)
+            system_blocks, chat_messages = _split_system(messages)
             
             kwargs = {
                 "model": self.model,
@@ -231,8 +286,8 @@ class AnthropicProvider(LLMProvider):
                 "max_tokens": max_tokens
             }
             
-            if system_message:
-                kwargs["system"] = system_message
+            if system_blocks:
+                kwargs["system"] = system_blocks
             
             async with self.client.messages.stream(**kwargs) as stream:
                 async for text in stream.text_stream:
@@ -243,15 +298,66 @@ class AnthropicProvider(LLMProvider):
             raise
 
 
+# Model name prefix -> provider class, checked in order
+_PREFIX_MAP: Tuple[Tuple[str, Type[LLMProvider]], ...] = (
+    ("gpt", OpenAIProvider),
+    ("o1", OpenAIProvider),
+    ("claude", AnthropicProvider),
+)
+
+# Providers created by get_llm_provider, keyed by event loop and then model name.
+# An SDK's HTTP client is bound to the loop it first ran on, so each loop gets
+# its own providers; None holds those created outside a running loop.
+_providers: Dict[Optional[asyncio.AbstractEventLoop], Dict[str, LLMProvider]] = {}
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
 def get_llm_provider(model: str = None) -> LLMProvider:
-    """Factory function to get appropriate LLM provider"""
+    """Factory function to get appropriate LLM provider, shared per model and event loop"""
     model = model or settings.DEFAULT_MODEL
+    loop = _running_loop()
+    
+    providers = _providers.get(loop)
+    if providers is None:
+        # Forget providers of closed loops; their clients can no longer be used
+        for closed in [key for key in _providers if key is not None and key.is_closed()]:
+            del _providers[closed]
+        providers = _providers[loop] = {}
     
-    if "gpt" in model.lower():
-        return OpenAIProvider(model=model)
-    elif "claude" in model.lower():
-        return AnthropicProvider(model=model)
+    provider = providers.get(model)
+    if provider is None:
+        provider = providers[model] = _create_provider(model)
+    return provider
+
+
+def _create_provider(model: str) -> LLMProvider:
+    # Model names are matched case-insensitively, e.g. "GPT-4o" or "Claude-3-5-sonnet"
+    name = model.lower()
+    for prefix, provider_cls in _PREFIX_MAP:
+        if name.startswith(prefix):
+            break
     else:
         # Default to OpenAI
         logger.warning(f"Unknown model {model}, defaulting to OpenAI")
-        return OpenAIProvider(model=model)
+        provider_cls = OpenAIProvider
+    
+    return provider_cls(model=model)
+
+
+async def close_llm_providers():
+    """Close all shared LLM providers"""
+    while _providers:
+        loop, providers = _providers.popitem()
+        if loop is not None and loop.is_closed():
+            continue
+        for provider in providers.values():
+            try:
+                await provider.close()
+            except Exception as e:
+                logger.warning(f"Failed to close LLM provider: {e}")
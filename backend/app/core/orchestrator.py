@@ -2,13 +2,61 @@
 Agent Orchestrator - Coordinates multiple agents
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, Awaitable, Callable
 from loguru import logger
+import asyncio
+import re
 import time
 
 from app.core.agents import BaseAgent, create_agent
 from app.core.rag_system import RAGSystem
-from app.models import AgentType, AgentStep, ChatRequest
+from app.models import AgentType, AgentStep, AgentStepMsg, ChatRequest
+
+
+# Heading for the plan section of each task category
+PLAN_HEADINGS = {
+    "code": "Execution Plan",
+    "debug": "Initial Assessment",
+    "optimize": "Analysis Plan",
+    "general": "Approach"
+}
+
+# Final response layout for each task category
+CODE_TEMPLATE = "## Implementation\n\n{code}\n\n## Code Review\n\n{review}\n\n## Execution Plan\n\n{plan}\n"
+DEBUG_TEMPLATE = "## Debugging Analysis\n\n{debug}\n\n## Initial Assessment\n\n{plan}\n"
+OPTIMIZE_TEMPLATE = "## Optimization Suggestions\n\n{optimize}\n\n## Analysis Plan\n\n{plan}\n"
+GENERAL_TEMPLATE = "## Solution\n\n{code}\n\n## Approach\n\n{plan}\n"
+
+# Routing keywords for each task category, highest priority first
+ROUTE_KEYWORDS = (
+    ("code", (
+        "write", "code", "implement", "create", "build", "develop",
+        "function", "class", "api", "endpoint"
+    )),
+    ("debug", ("debug", "fix", "error", "issue")),
+    ("optimize", ("optimize", "improve", "performance")),
+)
+
+# One compiled alternation scans the message once for whole-word keywords
+_ROUTE_RE = re.compile(
+    r"\b(" + "|".join(keyword for _, keywords in ROUTE_KEYWORDS for keyword in keywords) + r")\b",
+    re.IGNORECASE
+)
+_ROUTE_CATEGORY = {
+    keyword: category for category, keywords in ROUTE_KEYWORDS for keyword in keywords
+}
+_ROUTE_PRIORITY = {category: rank for rank, (category, _) in enumerate(ROUTE_KEYWORDS)}
+
+# Agents that answer each task category
+CATEGORY_AGENTS = {
+    "code": (AgentType.PLANNER, AgentType.CODER, AgentType.REVIEWER),
+    "debug": (AgentType.PLANNER, AgentType.DEBUGGER),
+    "optimize": (AgentType.PLANNER, AgentType.OPTIMIZER),
+    "general": (AgentType.PLANNER, AgentType.CODER)
+}
+
+# Runs one task category and returns (final response, execution trace)
+TaskHandler = Callable[[ChatRequest, Optional[str]], Awaitable[Tuple[str, List[AgentStep]]]]
 
 
 class AgentOrchestrator:
@@ -17,7 +65,12 @@ class AgentOrchestrator:
     def __init__(self, rag_system: Optional[RAGSystem] = None):
         self.rag_system = rag_system
         self.agents: Dict[AgentType, BaseAgent] = {}
-        self.execution_trace: List[AgentStep] = []
+        self._handlers: Dict[str, TaskHandler] = {
+            "code": self._handle_code,
+            "debug": self._handle_debug,
+            "optimize": self._handle_optimize,
+            "general": self._handle_general
+        }
     
     def get_agent(self, agent_type: AgentType) -> BaseAgent:
         """Get or create an agent"""
@@ -25,6 +78,150 @@ class AgentOrchestrator:
             self.agents[agent_type] = create_agent(agent_type)
         return self.agents[agent_type]
     
+    def has_history(self) -> bool:
+        """Whether any agent remembers earlier turns of the conversation"""
+        return any(agent.has_history for agent in self.agents.values())
+    
+    def remember_turn(self, message: str, response: str):
+        """Record a turn answered without the agents, e.g. from a response cache"""
+        for agent_type in CATEGORY_AGENTS[self._classify_task(message)]:
+            self.get_agent(agent_type).remember_exchange(message, response)
+    
+    def _classify_task(self, message: str) -> str:
+        """Classify a request as 'code', 'debug', 'optimize' or 'general'"""
+        categories = {_ROUTE_CATEGORY[match.lower()] for match in _ROUTE_RE.findall(message)}
+        if not categories:
+            return "general"
+        return min(categories, key=_ROUTE_PRIORITY.__getitem__)
+    
+    async def _retrieve_context(
+        self,
+        request: ChatRequest
+    ) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """Get relevant context and its sources from RAG if enabled"""
+        context = None
+        sources = []
+        
+        if request.use_rag and self.rag_system and self.rag_system.cag_context:
+            # Small corpus preloaded in full, no retrieval needed
+            return self.rag_system.cag_context, self.rag_system.cag_sources
+        
+        if request.use_rag and self.rag_system:
+            logger.info("Retrieving context from RAG system...")
+            rag_response = await self.rag_system.query(
+                query=request.message,
+                top_k=5
+            )
+            
+            if rag_response.results:
+                context = self.rag_system.format_context(rag_response.results)
+                sources = [
+                    {
+                        "content": chunk.content[:200] + "...",
+                        "metadata": chunk.metadata,
+                        "score": chunk.score
+                    }
+                    for chunk in rag_response.results
+                ]
+        
+        return context, sources
+    
+    def _format_trace(self, execution_trace: List[AgentStep]) -> List[AgentStepMsg]:
+        """Summarize an execution trace for API responses"""
+        return [
+            AgentStepMsg(
+                agent=step.agent_type.value,
+                input=step.input[:200] + "..." if len(step.input) > 200 else step.input,
+                output=step.output[:500] + "..." if len(step.output) > 500 else step.output,
+                tools_used=step.tools_used,
+                timestamp=step.timestamp
+            )
+            for step in execution_trace
+        ]
+    
+    def _plan(self, request: ChatRequest, context: Optional[str]) -> Awaitable[AgentStep]:
+        """Start the planner on a request"""
+        return self.get_agent(AgentType.PLANNER).execute(
+            task=f"Create a plan to accomplish this task:\n{request.message}",
+            context=context
+        )
+    
+    async def _handle_code(
+        self,
+        request: ChatRequest,
+        context: Optional[str]
+    ) -> Tuple[str, List[AgentStep]]:
+        """Coding task: the coder follows the plan, so it runs after the planner"""
+        plan_step = await self._plan(request, context)
+        code_step = await self.get_agent(AgentType.CODER).execute(
+            task=f"Implement the following:\n{request.message}\n\nPlan:\n{plan_step.output}",
+            context=context
+        )
+        
+        # Review the code
+        review_step = await self.get_agent(AgentType.REVIEWER).execute(
+            task=f"Review this code:\n{code_step.output}"
+        )
+        
+        final_response = CODE_TEMPLATE.format_map({
+            "code": code_step.output,
+            "review": review_step.output,
+            "plan": plan_step.output
+        })
+        return final_response, [plan_step, code_step, review_step]
+    
+    async def _handle_debug(
+        self,
+        request: ChatRequest,
+        context: Optional[str]
+    ) -> Tuple[str, List[AgentStep]]:
+        """Debugging task: the debugger does not need the plan, run both at once"""
+        plan_step, debug_step = await asyncio.gather(
+            self._plan(request, context),
+            self.get_agent(AgentType.DEBUGGER).execute(task=request.message, context=context)
+        )
+        
+        final_response = DEBUG_TEMPLATE.format_map({
+            "debug": debug_step.output,
+            "plan": plan_step.output
+        })
+        return final_response, [plan_step, debug_step]
+    
+    async def _handle_optimize(
+        self,
+        request: ChatRequest,
+        context: Optional[str]
+    ) -> Tuple[str, List[AgentStep]]:
+        """Optimization task: the optimizer does not need the plan, run both at once"""
+        plan_step, optimize_step = await asyncio.gather(
+            self._plan(request, context),
+            self.get_agent(AgentType.OPTIMIZER).execute(task=request.message, context=context)
+        )
+        
+        final_response = OPTIMIZE_TEMPLATE.format_map({
+            "optimize": optimize_step.output,
+            "plan": plan_step.output
+        })
+        return final_response, [plan_step, optimize_step]
+    
+    async def _handle_general(
+        self,
+        request: ChatRequest,
+        context: Optional[str]
+    ) -> Tuple[str, List[AgentStep]]:
+        """General task: just use planner + coder"""
+        plan_step = await self._plan(request, context)
+        code_step = await self.get_agent(AgentType.CODER).execute(
+            task=f"{request.message}\n\nFollow this plan:\n{plan_step.output}",
+            context=context
+        )
+        
+        final_response = GENERAL_TEMPLATE.format_map({
+            "code": code_step.output,
+            "plan": plan_step.output
+        })
+        return final_response, [plan_step, code_step]
+    
     async def execute_task(
         self,
         request: ChatRequest
@@ -39,157 +236,148 @@ class AgentOrchestrator:
             Dict with response and execution trace
         """
         start_time = time.time()
-        self.execution_trace = []
         
         try:
             # Step 1: Get relevant context from RAG if enabled
-            context = None
-            sources = []
+            context, sources = await self._retrieve_context(request)
             
-            if request.use_rag and self.rag_system:
-                logger.info("Retrieving context from RAG system...")
-                rag_response = await self.rag_system.query(
-                    query=request.message,
-                    top_k=5
-                )
-                
-                if rag_response.results:
-                    context = self.rag_system.format_context(rag_response.results)
-                    sources = [
-                        {
-                            "content": chunk.content[:200] + "...",
-                            "metadata": chunk.metadata,
-                            "score": chunk.score
-                        }
-                        for chunk in rag_response.results
-                    ]
+            # Step 2: Determine the task type
+            category = self._classify_task(request.message)
             
-            # Step 2: Plan the task
+            # Step 3: Plan the task and execute based on task type
             logger.info("Planning task...")
-            planner = self.get_agent(AgentType.PLANNER)
-            plan_step = await planner.execute(
+            final_response, execution_trace = await self._handlers[category](request, context)
+            
+            execution_time = time.time() - start_time
+            
+            logger.info(f"Task completed in {execution_time:.2f}s using {len(execution_trace)} agents")
+            
+            return {
+                "response": final_response,
+                "agent_trace": self._format_trace(execution_trace),
+                "sources": sources,
+                "execution_time": execution_time
+            }
+            
+        except Exception as e:
+            logger.error(f"Task execution failed: {e}")
+            raise
+    
+    async def _stream_agent(
+        self,
+        agent_type: AgentType,
+        execution_trace: List[AgentStep],
+        task: str,
+        context: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream one agent's output as delta events and record its step"""
+        agent = self.get_agent(agent_type)
+        async for chunk in agent.execute_stream(
+            task=task,
+            context=context,
+            on_complete=execution_trace.append
+        ):
+            yield {"delta": chunk}
+    
+    async def execute_task_stream(
+        self,
+        request: ChatRequest
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Execute a task using multiple agents, streaming the response
+        
+        The plan is streamed first so output starts as soon as the planner
+        produces tokens; the remaining sections follow in execution order.
+        
+        Args:
+            request: Chat request with task details
+            
+        Yields:
+            {"delta": text} events, then a final event with the execution
+            trace, sources and execution time
+        """
+        start_time = time.time()
+        execution_trace: List[AgentStep] = []
+        
+        try:
+            context, sources = await self._retrieve_context(request)
+            category = self._classify_task(request.message)
+            
+            # Plan the task
+            yield {"delta": f"## {PLAN_HEADINGS[category]}\n\n"}
+            async for event in self._stream_agent(
+                AgentType.PLANNER,
+                execution_trace,
                 task=f"Create a plan to accomplish this task:\n{request.message}",
                 context=context
-            )
-            self.execution_trace.append(plan_step)
-            
-            # Step 3: Determine if we need coding
-            task_lower = request.message.lower()
-            needs_coding = any(keyword in task_lower for keyword in [
-                "write", "code", "implement", "create", "build", "develop",
-                "function", "class", "api", "endpoint"
-            ])
+            ):
+                yield event
+            plan_output = execution_trace[-1].output
             
-            # Step 4: Execute based on task type
-            if needs_coding:
-                # Coding task
-                coder = self.get_agent(AgentType.CODER)
-                code_step = await coder.execute(
-                    task=f"Implement the following:\n{request.message}\n\nPlan:\n{plan_step.output}",
+            # Execute based on task type
+            if category == "code":
+                yield {"delta": "\n\n## Implementation\n\n"}
+                async for event in self._stream_agent(
+                    AgentType.CODER,
+                    execution_trace,
+                    task=f"Implement the following:\n{request.message}\n\nPlan:\n{plan_output}",
                     context=context
-                )
-                self.execution_trace.append(code_step)
-                
-                # Review the code
-                reviewer = self.get_agent(AgentType.REVIEWER)
-                review_step = await reviewer.execute(
-                    task=f"Review this code:\n{code_step.output}"
-                )
-                self.execution_trace.append(review_step)
+                ):
+                    yield event
+                code_output = execution_trace[-1].output
                 
-                final_response = f"""## Implementation
-
-{code_step.output}
-
-## Code Review
-
-{review_step.output}
-
-## Execution Plan
-
-{plan_step.output}
-"""
-            
-            elif any(keyword in task_lower for keyword in ["debug", "fix", "error", "issue"]):
-                # Debugging task
-                debugger = self.get_agent(AgentType.DEBUGGER)
-                debug_step = await debugger.execute(
+                yield {"delta": "\n\n## Code Review\n\n"}
+                async for event in self._stream_agent(
+                    AgentType.REVIEWER,
+                    execution_trace,
+                    task=f"Review this code:\n{code_output}"
+                ):
+                    yield event
+                    
+            elif category == "debug":
+                yield {"delta": "\n\n## Debugging Analysis\n\n"}
+                async for event in self._stream_agent(
+                    AgentType.DEBUGGER,
+                    execution_trace,
                     task=request.message,
                     context=context
-                )
-                self.execution_trace.append(debug_step)
-                
-                final_response = f"""## Debugging Analysis
-
-{debug_step.output}
-
-## Initial Assessment
-
-{plan_step.output}
-"""
-            
-            elif any(keyword in task_lower for keyword in ["optimize", "improve", "performance"]):
-                # Optimization task
-                optimizer = self.get_agent(AgentType.OPTIMIZER)
-                optimize_step = await optimizer.execute(
+                ):
+                    yield event
+                    
+            elif category == "optimize":
+                yield {"delta": "\n\n## Optimization Suggestions\n\n"}
+                async for event in self._stream_agent(
+                    AgentType.OPTIMIZER,
+                    execution_trace,
                     task=request.message,
                     context=context
-                )
-                self.execution_trace.append(optimize_step)
-                
-                final_response = f"""## Optimization Suggestions
-
-{optimize_step.output}
-
-## Analysis Plan
-
-{plan_step.output}
-"""
-            
+                ):
+                    yield event
+                    
             else:
-                # General task - just use planner + coder
-                coder = self.get_agent(AgentType.CODER)
-                code_step = await coder.execute(
-                    task=f"{request.message}\n\nFollow this plan:\n{plan_step.output}",
+                yield {"delta": "\n\n## Solution\n\n"}
+                async for event in self._stream_agent(
+                    AgentType.CODER,
+                    execution_trace,
+                    task=f"{request.message}\n\nFollow this plan:\n{plan_output}",
                     context=context
-                )
-                self.execution_trace.append(code_step)
-                
-                final_response = f"""## Solution
-
-{code_step.output}
-
-## Approach
-
-{plan_step.output}
-"""
+                ):
+                    yield event
             
             execution_time = time.time() - start_time
+            logger.info(f"Streamed task completed in {execution_time:.2f}s using {len(execution_trace)} agents")
             
-            logger.info(f"Task completed in {execution_time:.2f}s using {len(self.execution_trace)} agents")
-            
-            return {
-                "response": final_response,
-                "agent_trace": [
-                    {
-                        "agent": step.agent_type.value,
-                        "input": step.input[:200] + "..." if len(step.input) > 200 else step.input,
-                        "output": step.output[:500] + "..." if len(step.output) > 500 else step.output,
-                        "tools_used": step.tools_used,
-                        "timestamp": step.timestamp.isoformat()
-                    }
-                    for step in self.execution_trace
-                ],
+            yield {
+                "agent_trace": self._format_trace(execution_trace),
                 "sources": sources,
                 "execution_time": execution_time
             }
             
         except Exception as e:
-            logger.error(f"Task execution failed: {e}")
+            logger.error(f"Streamed task execution failed: {e}")
             raise
     
     def reset(self):
         """Reset all agents"""
         for agent in self.agents.values():
             agent.reset_history()
-        self.execution_trace = []
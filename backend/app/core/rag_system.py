@@ -4,18 +4,87 @@ RAG (Retrieval-Augmented Generation) System
 
 from typing import List, Dict, Any, Optional
 from loguru import logger
+import hashlib
+import io
 import time
 
+from app.config import settings
+from app.core.cache import SmartRAGCache
 from app.core.vector_store import VectorStoreManager
 from app.models import DocumentChunk, RAGResponse
 
 
+# Layout of the context string built by format_context
+_CONTEXT_HEADER = "## Retrieved Context:\n\n"
+_CHUNK_TEMPLATE = "### Source {index}: {source}\n\n{content}\n\n---\n"
+
+
 class RAGSystem:
     """Retrieval-Augmented Generation system for code assistance"""
     
     def __init__(self, vector_store: VectorStoreManager):
         self.vector_store = vector_store
+        self.cache = SmartRAGCache(
+            similarity_threshold=settings.RAG_CACHE_THRESHOLD,
+            max_size=settings.RAG_CACHE_MAX_SIZE,
+            ttl=settings.RAG_CACHE_TTL
+        )
+        self._cache_version = vector_store.version
+        # Full-corpus context used instead of retrieval when the corpus is small
+        self.cag_context: Optional[str] = None
+        self.cag_sources: List[Dict[str, Any]] = []
+        self.cag_prefix_hash: Optional[str] = None
+        
+    async def load_cag_context(self, max_tokens: int = None) -> bool:
+        """
+        Preload the whole corpus as a static context if it fits the token budget
+        
+        The context is identical on every request, so providers with prompt
+        caching reuse its prefill instead of recomputing it per turn.
+        
+        Args:
+            max_tokens: Token budget for the corpus, estimated at 4 chars per token
+            
+        Returns:
+            True if cache-augmented generation is active
+        """
+        max_tokens = max_tokens or settings.CAG_MAX_TOKENS
+        self.cag_context = None
+        self.cag_sources = []
+        self.cag_prefix_hash = None
         
+        try:
+            documents = await self.vector_store.get_all_documents()
+        except Exception as e:
+            logger.error(f"Failed to load corpus for CAG: {e}")
+            return False
+        
+        estimated_tokens = sum(len(doc['content']) for doc in documents) // 4
+        if not documents or estimated_tokens > max_tokens:
+            logger.info(f"CAG disabled: corpus is ~{estimated_tokens} tokens (limit {max_tokens})")
+            return False
+        
+        chunks = [
+            DocumentChunk(content=doc['content'], metadata=doc['metadata'], score=1.0, id=doc['id'])
+            for doc in documents
+        ]
+        self.cag_context = self.format_context(chunks, max_chars=None)
+        self.cag_sources = [
+            {
+                "content": chunk.content[:200] + "...",
+                "metadata": chunk.metadata,
+                "score": chunk.score
+            }
+            for chunk in chunks
+        ]
+        self.cag_prefix_hash = hashlib.sha256(self.cag_context.encode("utf-8")).hexdigest()
+        
+        logger.info(
+            f"CAG enabled: preloaded {len(documents)} documents "
+            f"(~{estimated_tokens} tokens, prefix {self.cag_prefix_hash[:12]})"
+        )
+        return True
+    
     async def query(
         self,
         query: str,
@@ -36,22 +105,10 @@ class RAGSystem:
         start_time = time.time()
         
         try:
-            # Search vector store
-            results = await self.vector_store.search(
-                query=query,
-                top_k=top_k,
-                filter_metadata=filter_metadata
-            )
-            
-            # Convert to DocumentChunk objects
-            chunks = [
-                DocumentChunk(
-                    content=result['content'],
-                    metadata=result['metadata'],
-                    score=result.get('score', 0.0)
-                )
-                for result in results
-            ]
+            if settings.RAG_CACHE_ENABLED:
+                chunks = await self._cached_query(query, top_k, filter_metadata)
+            else:
+                chunks = await self._search(query, top_k, filter_metadata)
             
             query_time = time.time() - start_time
             
@@ -66,6 +123,65 @@ class RAGSystem:
             logger.error(f"RAG query failed: {e}")
             return RAGResponse(results=[], query_time=time.time() - start_time)
     
+    async def _cached_query(
+        self,
+        query: str,
+        top_k: int,
+        filter_metadata: Optional[Dict[str, Any]]
+    ) -> List[DocumentChunk]:
+        """Serve a query from the exact or semantic cache, searching on a miss"""
+        # Results cached before the last write may be missing new documents
+        if self._cache_version != self.vector_store.version:
+            self.cache.clear()
+            self._cache_version = self.vector_store.version
+        
+        key, params = self.cache.make_keys(query, top_k, filter_metadata)
+        chunks = self.cache.get(key)
+        if chunks is not None:
+            return chunks
+        
+        embedding = await self.vector_store.embed(query)
+        chunks = self.cache.get_similar(params, embedding)
+        if chunks is not None:
+            return chunks
+        
+        results = await self.vector_store.search_by_embedding(
+            embedding,
+            top_k=top_k,
+            filter_metadata=filter_metadata
+        )
+        chunks = self._to_chunks(results)
+        # Failed searches come back empty, don't pin them in the cache
+        if chunks:
+            self.cache.put(key, params, embedding, chunks)
+        return chunks
+    
+    async def _search(
+        self,
+        query: str,
+        top_k: int,
+        filter_metadata: Optional[Dict[str, Any]]
+    ) -> List[DocumentChunk]:
+        """Search the vector store without caching"""
+        results = await self.vector_store.search(
+            query=query,
+            top_k=top_k,
+            filter_metadata=filter_metadata
+        )
+        return self._to_chunks(results)
+    
+    def _to_chunks(self, results: List[Dict[str, Any]]) -> List[DocumentChunk]:
+        """Convert vector store results to DocumentChunk objects"""
+        return [
+            DocumentChunk(
+                content=result['content'],
+                metadata=result['metadata'],
+                score=result.get('score', 0.0),
+                id=result.get('id')
+            )
+            for result in results
+        ]
+    
     async def add_documentation(
         self,
         documents: List[str],
@@ -78,21 +194,56 @@ class RAGSystem:
                 metadatas=metadatas
             )
             logger.info(f"Added {len(documents)} documents to RAG system")
+            
+            # Rebuild the preloaded corpus so it includes the new documents
+            if self.cag_context is not None:
+                await self.load_cag_context()
         except Exception as e:
             logger.error(f"Failed to add documentation: {e}")
             raise
     
-    def format_context(self, chunks: List[DocumentChunk]) -> str:
-        """Format retrieved chunks into context string"""
+    def format_context(
+        self,
+        chunks: List[DocumentChunk],
+        max_chars: Optional[int] = 8000
+    ) -> str:
+        """
+        Format retrieved chunks into context string
+        
+        Chunks are taken in score order, skipping duplicates (same source and
+        opening text), until their content reaches ``max_chars``; the chunk that
+        crosses the limit is truncated. The selection is then emitted in ID
+        order and without per-query scores, so queries that retrieve the same
+        chunks produce the same, cacheable prompt prefix.
+        """
         if not chunks:
             return ""
         
-        context_parts = ["## Retrieved Context:\n"]
-        for i, chunk in enumerate(chunks, 1):
+        selected = []
+        seen = set()
+        remaining = max_chars if max_chars is not None else float("inf")
+        for chunk in sorted(chunks, key=lambda chunk: chunk.score or 0.0, reverse=True):
+            if remaining <= 0:
+                break
             source = chunk.metadata.get('source', 'Unknown')
-            context_parts.append(f"### Source {i}: {source}")
-            context_parts.append(f"Relevance: {chunk.score:.2f}\n")
-            context_parts.append(chunk.content)
-            context_parts.append("\n---\n")
+            key = (source, chunk.content[:200])
+            if key in seen:
+                continue
+            seen.add(key)
+            
+            content = chunk.content
+            if len(content) > remaining:
+                content = content[:int(remaining)]
+            remaining -= len(content)
+            selected.append((chunk.id or "", source, content))
+        
+        selected.sort(key=lambda item: item[0])
+        
+        buffer = io.StringIO()
+        buffer.write(_CONTEXT_HEADER)
+        for i, (_, source, content) in enumerate(selected, 1):
+            if i > 1:
+                buffer.write("\n")
+            buffer.write(_CHUNK_TEMPLATE.format(index=i, source=source, content=content))
         
-        return "\n".join(context_parts)
+        return buffer.getvalue()
@@ -2,17 +2,197 @@
 Tools for function calling and agent actions
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from loguru import logger
+import asyncio
+import math
+import os
 import sys
 import io
+import threading
 from contextlib import redirect_stdout, redirect_stderr
 import time
 
+# Resource limits are only available on Unix
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import aiofiles
+except ImportError:
+    aiofiles = None
+
+# Chunk size for file reads
+READ_CHUNK_SIZE = 64 * 1024
+
+# Unprivileged user the workers switch to when the server runs as root
+NOBODY_UID = 65534
+
+
+# Builtins available to executed code
+SAFE_BUILTINS = {
+    'print': print,
+    'len': len,
+    'range': range,
+    'str': str,
+    'int': int,
+    'float': float,
+    'list': list,
+    'dict': dict,
+    'set': set,
+    'tuple': tuple,
+    'bool': bool,
+    'sum': sum,
+    'max': max,
+    'min': min,
+    'abs': abs,
+    'round': round,
+    'sorted': sorted,
+    'enumerate': enumerate,
+    'zip': zip,
+    'map': map,
+    'filter': filter,
+}
+
+
+def _run_python(code: str, cpu_seconds: Optional[int] = None) -> Dict[str, Any]:
+    """Execute code with restricted builtins, capturing stdout and stderr"""
+    if resource is not None and cpu_seconds:
+        # RLIMIT_CPU counts the worker's total CPU time, so allow this much more;
+        # round the time used up so the job always gets its full allowance
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = math.ceil(usage.ru_utime + usage.ru_stime) + cpu_seconds
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    
+    try:
+        # Create string buffers for stdout/stderr
+        stdout_buffer = io.StringIO()
+        stderr_buffer = io.StringIO()
+        
+        restricted_globals = {'__builtins__': SAFE_BUILTINS}
+        
+        with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
+            exec(code, restricted_globals, {})
+        
+        output = stdout_buffer.getvalue()
+        error = stderr_buffer.getvalue()
+        
+        return {
+            "success": not error,
+            "output": output,
+            "error": error if error else None
+        }
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "output": None,
+            "error": str(e) or type(e).__name__
+        }
+
+
+def _init_worker(memory_mb: int):
+    """Worker initializer: apply resource limits, drop root, and warm up"""
+    if resource is not None:
+        try:
+            # Forked workers inherit the server's address space; cap growth beyond it
+            with open("/proc/self/statm") as f:
+                current = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+            limit = current + memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (OSError, ValueError):
+            pass
+    
+    if hasattr(os, "geteuid") and os.geteuid() == 0:
+        try:
+            os.setgroups([])
+            os.setgid(NOBODY_UID)
+            os.setuid(NOBODY_UID)
+        except OSError:
+            pass
+    
+    _run_python("pass")
+
+
+def _start_worker(memory_mb: int) -> ProcessPoolExecutor:
+    """Start one warm worker process"""
+    worker = ProcessPoolExecutor(
+        max_workers=1,
+        initializer=_init_worker,
+        initargs=(memory_mb,)
+    )
+    # The process is spawned lazily; submit a task to fork it now
+    worker.submit(_run_python, "pass")
+    return worker
+
+
+def _kill_worker(worker: ProcessPoolExecutor):
+    """Terminate a worker, including any user code it is still running"""
+    for process in list((getattr(worker, "_processes", None) or {}).values()):
+        process.terminate()
+    worker.shutdown(wait=False, cancel_futures=True)
+
 
 class CodeExecutor:
     """Safely execute code in a restricted environment"""
     
+    # Warm worker processes, started with the application. Each is its own
+    # single-process executor and is held by one execution at a time, so a
+    # stuck or killed worker never breaks another request's execution
+    workers: List[ProcessPoolExecutor] = []
+    memory_mb: int = 256
+    # Workers not currently running code, created on first use in the event loop
+    _idle: Optional[asyncio.Queue] = None
+    
+    @classmethod
+    def start_pool(cls, max_workers: int = 2, memory_mb: int = 256):
+        """Start the worker pool and warm up every worker"""
+        cls.memory_mb = memory_mb
+        cls.workers = [_start_worker(memory_mb) for _ in range(max_workers)]
+        cls._idle = None
+        logger.info(f"Code executor pool started with {max_workers} workers")
+    
+    @classmethod
+    def shutdown_pool(cls, kill: bool = False):
+        """Stop the worker pool, terminating running code if kill is set"""
+        workers, cls.workers, cls._idle = cls.workers, [], None
+        for worker in workers:
+            if kill:
+                _kill_worker(worker)
+            else:
+                worker.shutdown(wait=True, cancel_futures=True)
+    
+    @classmethod
+    async def _acquire(cls) -> ProcessPoolExecutor:
+        """Wait for an idle worker and take it"""
+        if cls._idle is None:
+            cls._idle = asyncio.Queue()
+            for worker in cls.workers:
+                cls._idle.put_nowait(worker)
+        return await cls._idle.get()
+    
+    @classmethod
+    def _release(cls, worker: ProcessPoolExecutor, replace: bool = False):
+        """Return a worker to the pool, swapping in a fresh one if replace is set"""
+        if worker not in cls.workers:
+            # The pool was shut down or restarted while this worker was busy
+            if replace:
+                _kill_worker(worker)
+            return
+        if replace:
+            _kill_worker(worker)
+            fresh = _start_worker(cls.memory_mb)
+            cls.workers[cls.workers.index(worker)] = fresh
+            worker = fresh
+        cls._idle.put_nowait(worker)
+    
     @staticmethod
     async def execute_python(code: str, timeout: int = 30) -> Dict[str, Any]:
         """
@@ -27,73 +207,78 @@ class CodeExecutor:
         """
         start_time = time.time()
         
-        try:
-            # Create string buffers for stdout/stderr
-            stdout_buffer = io.StringIO()
-            stderr_buffer = io.StringIO()
-            
-            # Restricted globals
-            restricted_globals = {
-                '__builtins__': {
-                    'print': print,
-                    'len': len,
-                    'range': range,
-                    'str': str,
-                    'int': int,
-                    'float': float,
-                    'list': list,
-                    'dict': dict,
-                    'set': set,
-                    'tuple': tuple,
-                    'bool': bool,
-                    'sum': sum,
-                    'max': max,
-                    'min': min,
-                    'abs': abs,
-                    'round': round,
-                    'sorted': sorted,
-                    'enumerate': enumerate,
-                    'zip': zip,
-                    'map': map,
-                    'filter': filter,
+        if not CodeExecutor.workers:
+            # No worker pool (e.g. outside the app), run in-process
+            result = _run_python(code)
+        else:
+            loop = asyncio.get_running_loop()
+            worker = await CodeExecutor._acquire()
+            replace = False
+            try:
+                result = await asyncio.wait_for(
+                    loop.run_in_executor(worker, _run_python, code, timeout),
+                    timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                # This job's worker is stuck in user code; replace only that worker
+                logger.warning(f"Code execution timed out after {timeout}s, replacing worker")
+                replace = True
+                result = {
+                    "success": False,
+                    "output": None,
+                    "error": f"Execution timed out after {timeout} seconds"
                 }
-            }
-            
-            # Execute with timeout
-            with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
-                exec(code, restricted_globals, {})
-            
-            output = stdout_buffer.getvalue()
-            error = stderr_buffer.getvalue()
-            
-            execution_time = time.time() - start_time
-            
-            return {
-                "success": not error,
-                "output": output,
-                "error": error if error else None,
-                "execution_time": execution_time
-            }
-            
-        except Exception as e:
-            execution_time = time.time() - start_time
-            return {
-                "success": False,
-                "output": None,
-                "error": str(e),
-                "execution_time": execution_time
-            }
+            except BrokenProcessPool:
+                # The worker is held exclusively, so it was this job's code that
+                # got it killed, e.g. for exceeding its CPU or memory limit
+                logger.warning("Code execution worker died, replacing worker")
+                replace = True
+                result = {
+                    "success": False,
+                    "output": None,
+                    "error": "Execution was terminated (resource limit exceeded)"
+                }
+            except asyncio.CancelledError:
+                # The caller went away; do not hand a busy worker to the next job
+                replace = True
+                raise
+            except Exception as e:
+                result = {"success": False, "output": None, "error": str(e)}
+            finally:
+                CodeExecutor._release(worker, replace=replace)
+        
+        result["execution_time"] = time.time() - start_time
+        return result
 
 
 class FileOperations:
     """File system operations"""
     
+    @staticmethod
+    def _read_sync(file_path: str) -> str:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    
+    @staticmethod
+    def _write_sync(file_path: str, content: str):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+    
     @staticmethod
     async def read_file(file_path: str) -> Dict[str, Any]:
         """Read a file"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            if aiofiles is None:
+                content = await asyncio.to_thread(FileOperations._read_sync, file_path)
+            else:
+                buffer = io.StringIO()
+                async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
+                    while True:
+                        chunk = await f.read(READ_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        buffer.write(chunk)
+                content = buffer.getvalue()
             return {"success": True, "content": content}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -102,8 +287,11 @@ class FileOperations:
     async def write_file(file_path: str, content: str) -> Dict[str, Any]:
         """Write to a file"""
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            if aiofiles is None:
+                await asyncio.to_thread(FileOperations._write_sync, file_path, content)
+            else:
+                async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
+                    await f.write(content)
             return {"success": True}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -112,6 +300,34 @@ class FileOperations:
 class WebSearch:
     """Web search functionality"""
     
+    # Idle DuckDuckGo clients, reused across searches so their HTTP sessions are
+    # pooled. A client serves one search at a time; the lock only guards the list.
+    _idle_clients: List[Any] = []
+    _lock = threading.Lock()
+    
+    @classmethod
+    def _search_sync(cls, query: str, max_results: int) -> List[Dict[str, str]]:
+        # Import here to handle optional dependency
+        from duckduckgo_search import DDGS
+        
+        with cls._lock:
+            client = cls._idle_clients.pop() if cls._idle_clients else None
+        if client is None:
+            client = DDGS()
+        
+        try:
+            return [
+                {
+                    "title": result.get("title", ""),
+                    "url": result.get("href", ""),
+                    "snippet": result.get("body", "")
+                }
+                for result in client.text(query, max_results=max_results)
+            ]
+        finally:
+            with cls._lock:
+                cls._idle_clients.append(client)
+    
     @staticmethod
     async def search(query: str, max_results: int = 5) -> Dict[str, Any]:
         """
@@ -125,18 +341,8 @@ class WebSearch:
             Dict with search results
         """
         try:
-            # Import here to handle optional dependency
-            from duckduckgo_search import DDGS
-            
-            results = []
-            with DDGS() as ddgs:
-                for result in ddgs.text(query, max_results=max_results):
-                    results.append({
-                        "title": result.get("title", ""),
-                        "url": result.get("href", ""),
-                        "snippet": result.get("body", "")
-                    })
-            
+            # The client is blocking, keep it off the event loop
+            results = await asyncio.to_thread(WebSearch._search_sync, query, max_results)
             return {"success": True, "results": results}
             
         except ImportError:
@@ -209,21 +415,24 @@ AVAILABLE_TOOLS = [
 ]
 
 
+# Tools as plain functions
+execute_python = CodeExecutor.execute_python
+read_file = FileOperations.read_file
+write_file = FileOperations.write_file
+web_search = WebSearch.search
+
+
 async def execute_tool(tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
     """Execute a tool by name"""
     
-    executor = CodeExecutor()
-    file_ops = FileOperations()
-    web_search = WebSearch()
-    
     if tool_name == "execute_python":
-        return await executor.execute_python(arguments.get("code", ""))
+        return await execute_python(arguments.get("code", ""))
     elif tool_name == "web_search":
-        return await web_search.search(
+        return await web_search(
             arguments.get("query", ""),
             arguments.get("max_results", 5)
         )
     elif tool_name == "read_file":
-        return await file_ops.read_file(arguments.get("file_path", ""))
+        return await read_file(arguments.get("file_path", ""))
     else:
         return {"success": False, "error": f"Unknown tool: {tool_name}"}
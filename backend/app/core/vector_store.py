@@ -5,21 +5,105 @@ Vector Store Manager using ChromaDB
 import chromadb
 from chromadb.config import Settings as ChromaSettings
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple
+from cachetools import LRUCache
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from loguru import logger
+import numpy as np
+import asyncio
+import hashlib
+import orjson
 import os
+import threading
+import torch
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
 
 from app.config import settings
+from app.core.cache import EmbeddingCache
+
+
+# Above this many rows, in-memory searches run in a worker thread
+_INLINE_SEARCH_ROWS = 20_000
+
+# Encoded batches buffered between the encoder and the Chroma writer in add_documents
+_ADD_QUEUE_DEPTH = 4
+
+# Embedding models are shared and not thread-safe, so every encode runs on
+# this one worker thread; torch already spreads each call across cores
+_encode_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encode")
+
+# Rows upcast at a time when scoring a half-precision in-memory index
+_SCORE_BLOCK_ROWS = 4096
+
+# Saved copy of the in-memory index, memory-mapped on startup (prefixed by collection);
+# the rows file also records what the embeddings were built from
+_INDEX_EMBEDDINGS_FILE = "index_embeddings.npy"
+_INDEX_ROWS_FILE = "index_rows.json"
+
+
+@lru_cache(maxsize=4)
+def _get_model(name: str, backend: str = "torch", onnx_file: str = "") -> SentenceTransformer:
+    """Load an embedding model once per process"""
+    logger.info(f"Loading embedding model: {name} ({backend})")
+    if backend == "onnx":
+        # ONNX Runtime on CPU; a quantized export such as
+        # onnx/model_qint8_avx512_vnni.onnx runs the int8 kernels
+        model_kwargs = {"provider": "CPUExecutionProvider"}
+        if onnx_file:
+            model_kwargs["file_name"] = onnx_file
+        return SentenceTransformer(name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+    
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = SentenceTransformer(name, device=device)
+    if device == "cuda":
+        # FP16 halves memory traffic on GPU with no loss in retrieval quality
+        model.half()
+    return model
+
+
+def _embedding_model_id() -> str:
+    """Identify the configured model and backend, for keying stored embeddings"""
+    if settings.EMBEDDING_BACKEND == "onnx" and settings.EMBEDDING_ONNX_FILE:
+        return f"{settings.EMBEDDING_MODEL}@{settings.EMBEDDING_ONNX_FILE}"
+    return settings.EMBEDDING_MODEL
 
 
 class VectorStoreManager:
     """Manages vector database operations"""
     
-    def __init__(self):
+    def __init__(self, collection_name: str = "code_docs"):
         self.client = None
+        self.collection_name = collection_name
         self.collection = None
         self.embedding_model = None
-        
+        # Bumped on every write so query caches can tell when results are stale
+        self.version = 0
+        # Document count, refreshed after writes so reads never ask Chroma
+        self._n = 0
+        # Serializes mirror reloads and appends so they land in write order
+        self._index_lock: Optional[asyncio.Lock] = None
+        # Queries waiting to be sent to Chroma together, keyed by metadata filter
+        self._pending_queries: Dict[bytes, List[Tuple[np.ndarray, int, asyncio.Future]]] = {}
+        self._flush_tasks: Set[asyncio.Task] = set()
+        # Query embeddings by whitespace-normalized text
+        self._embedding_cache: LRUCache = LRUCache(maxsize=settings.EMBEDDING_CACHE_SIZE)
+        # Document embeddings by content hash, kept across runs
+        self._document_cache: Optional[EmbeddingCache] = None
+        # In-memory mirror of small collections: [N, D] normalized embeddings and rows
+        self._embeddings: Optional[np.ndarray] = None
+        self._rows: List[Tuple[str, str, Dict[str, Any]]] = []
+        # Preallocated storage the mirror grows into, doubled when full
+        self._embedding_buffer: Optional[np.ndarray] = None
+        # Set when rows were appended since the snapshot was last written
+        self._snapshot_stale = False
+        # FAISS index over the mirror: opt-in int8 for full scans, IVF-PQ for large mirrors
+        self._faiss_index = None
+    
     async def initialize(self):
         """Initialize vector store and embedding model"""
         try:
@@ -37,15 +121,32 @@ class VectorStoreManager:
             
             # Get or create collection
             self.collection = self.client.get_or_create_collection(
-                name="code_docs",
-                metadata={"description": "Code documentation and examples"}
+                name=self.collection_name,
+                metadata={
+                    "description": "Code documentation and examples",
+                    "hnsw:space": "cosine",
+                    "hnsw:construction_ef": 200,
+                    "hnsw:search_ef": 100,
+                    "hnsw:M": 32
+                }
             )
             
-            # Load embedding model
-            logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL}")
-            self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
+            # Load embedding model, shared with any other manager in this process
+            self.embedding_model = _get_model(
+                settings.EMBEDDING_MODEL,
+                settings.EMBEDDING_BACKEND,
+                settings.EMBEDDING_ONNX_FILE
+            )
+            self._document_cache = EmbeddingCache(
+                settings.EMBEDDING_DISK_CACHE_DIR,
+                _embedding_model_id(),
+                fuzzy_threshold=settings.EMBEDDING_FUZZY_THRESHOLD
+            )
             
-            logger.info(f"Vector store initialized with {self.collection.count()} documents")
+            self._index_lock = asyncio.Lock()
+            await self._load_in_memory_index(use_snapshot=True)
+            
+            logger.info(f"Vector store initialized with {self._n} documents")
             
         except Exception as e:
             logger.error(f"Failed to initialize vector store: {e}")
@@ -57,23 +158,65 @@ class VectorStoreManager:
         metadatas: List[Dict[str, Any]],
         ids: Optional[List[str]] = None
     ):
-        """Add documents to vector store"""
+        """
+        Add documents to vector store
+        
+        Documents are embedded batch by batch in a worker thread while earlier
+        batches are written to Chroma, with a bounded queue between the two
+        stages.
+        """
         try:
-            # Generate embeddings
-            embeddings = self.embedding_model.encode(documents).tolist()
-            
             # Generate IDs if not provided
             if ids is None:
-                current_count = self.collection.count()
-                ids = [f"doc_{current_count + i}" for i in range(len(documents))]
-            
-            # Add to collection
-            self.collection.add(
-                embeddings=embeddings,
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
+                ids = [f"doc_{self._n + i}" for i in range(len(documents))]
+            
+            batch_size = settings.EMBEDDING_BATCH_SIZE
+            queue: asyncio.Queue = asyncio.Queue(maxsize=_ADD_QUEUE_DEPTH)
+            written: List[np.ndarray] = []
+            
+            async def encode_batches():
+                try:
+                    for start in range(0, len(documents), batch_size):
+                        batch = documents[start:start + batch_size]
+                        embeddings = await self._run_encoder(self._encode_documents, batch)
+                        await queue.put((start, embeddings))
+                finally:
+                    # Always release the writer, even if encoding fails
+                    await queue.put(None)
+            
+            async def write_batches():
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        break
+                    start, embeddings = item
+                    end = start + len(embeddings)
+                    await asyncio.to_thread(
+                        self.collection.add,
+                        embeddings=embeddings,
+                        documents=documents[start:end],
+                        metadatas=metadatas[start:end],
+                        ids=ids[start:end]
+                    )
+                    written.append(embeddings)
+            
+            encoder = asyncio.create_task(encode_batches())
+            completed = False
+            try:
+                await write_batches()
+                await encoder
+                completed = True
+            finally:
+                # Stop encoding if a write failed
+                encoder.cancel()
+                self.version += 1
+                if completed and written:
+                    await self._extend_in_memory_index(
+                        ids, documents, metadatas, np.concatenate(written)
+                    )
+                elif not completed:
+                    # Unknown how much was written, read it back from Chroma
+                    await self._load_in_memory_index()
             
             logger.info(f"Added {len(documents)} documents to vector store")
             
@@ -81,6 +224,452 @@ class VectorStoreManager:
             logger.error(f"Failed to add documents: {e}")
             raise
     
+    async def add_precomputed(
+        self,
+        embeddings: np.ndarray,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None
+    ):
+        """Add documents whose embeddings were computed ahead of time, skipping the model"""
+        try:
+            if ids is None:
+                ids = [f"doc_{self._n + i}" for i in range(len(documents))]
+            
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            completed = False
+            try:
+                await asyncio.to_thread(
+                    self.collection.add,
+                    embeddings=embeddings,
+                    documents=documents,
+                    metadatas=metadatas,
+                    ids=ids
+                )
+                completed = True
+            finally:
+                self.version += 1
+                if completed:
+                    await self._extend_in_memory_index(ids, documents, metadatas, embeddings)
+                else:
+                    await self._load_in_memory_index()
+            
+            logger.info(f"Added {len(documents)} precomputed documents to vector store")
+            
+        except Exception as e:
+            logger.error(f"Failed to add precomputed documents: {e}")
+            raise
+    
+    def _encode_documents(self, documents: List[str]) -> np.ndarray:
+        """Embed documents, reusing embeddings from the on-disk cache"""
+        cache = self._document_cache
+        embeddings, missing = cache.find_uncached_texts(documents)
+        if missing:
+            # Encode each distinct key once; duplicates share its embedding
+            positions: Dict[str, List[int]] = {}
+            for i in missing:
+                positions.setdefault(cache.make_key(documents[i]), []).append(i)
+            encoded = self.embedding_model.encode(
+                [documents[indices[0]] for indices in positions.values()],
+                batch_size=settings.EMBEDDING_BATCH_SIZE,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+            for (key, indices), embedding in zip(positions.items(), encoded):
+                for i in indices:
+                    embeddings[i] = embedding
+                cache.put(key, embedding, content=documents[indices[0]])
+            cache.save()
+        return np.stack(embeddings).astype(np.float32, copy=False)
+    
+    def _run_encoder(self, func, *args, **kwargs) -> "asyncio.Future":
+        """Run an embedding call on the encoder thread, off the event loop"""
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(_encode_pool, partial(func, *args, **kwargs))
+    
+    async def encode_texts(self, texts: List[str]) -> np.ndarray:
+        """Encode texts as normalized vectors on the encoder thread"""
+        if not texts:
+            return np.zeros((0, self.embedding_model.get_sentence_embedding_dimension()), dtype=np.float32)
+        
+        # Encode each distinct text once and scatter the results back
+        unique: Dict[str, int] = {}
+        inverse = [unique.setdefault(text, len(unique)) for text in texts]
+        embeddings = await self._run_encoder(
+            self.embedding_model.encode,
+            list(unique),
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        embeddings = embeddings.astype(np.float32, copy=False)
+        return embeddings if len(unique) == len(texts) else embeddings[inverse]
+    
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed a single piece of text as a normalized vector, reusing recent results"""
+        key = " ".join(text.split())
+        embedding = self._embedding_cache.get(key)
+        if embedding is None:
+            embedding = (await self.encode_texts([key]))[0]
+            # Shared between callers, so make sure nobody modifies it in place
+            embedding.setflags(write=False)
+            self._embedding_cache[key] = embedding
+        return embedding
+    
+    async def _load_in_memory_index(self, use_snapshot: bool = False):
+        """
+        Mirror the collection into memory when it is small enough to scan directly
+        
+        The mirror is also saved next to the Chroma files. With ``use_snapshot``
+        a saved mirror built by the same model from the same documents is
+        memory-mapped instead of reading the embeddings back out of Chroma.
+        """
+        async with self._index_lock:
+            await self._reload_in_memory_index(use_snapshot)
+    
+    async def _reload_in_memory_index(self, use_snapshot: bool = False):
+        """Rebuild the in-memory index; callers hold ``_index_lock``"""
+        # Searches fall back to an exact scan until the FAISS index is rebuilt
+        self._faiss_index = None
+        self._embedding_buffer = None
+        count = self._n = await asyncio.to_thread(self.collection.count)
+        if count == 0 or count >= settings.IN_MEMORY_INDEX_MAX_DOCS:
+            self._embeddings = None
+            self._rows = []
+            self._remove_index_snapshot()
+            return
+        
+        if use_snapshot and await self._load_index_snapshot(count):
+            logger.debug(f"Mapped {count} embeddings from the saved in-memory index")
+        else:
+            results = await asyncio.to_thread(
+                self.collection.get,
+                include=["embeddings", "documents", "metadatas"]
+            )
+            embeddings = np.asarray(results['embeddings'], dtype=np.float32)
+            # Older collections may hold unnormalized vectors; scores must be cosine
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            self._embeddings = (embeddings / np.maximum(norms, 1e-12)).astype(settings.IN_MEMORY_INDEX_DTYPE)
+            self._rows = [
+                (doc_id, content, metadata or {})
+                for doc_id, content, metadata in zip(
+                    results['ids'], results['documents'], results['metadatas']
+                )
+            ]
+            await asyncio.to_thread(self._save_index_snapshot)
+            logger.debug(f"Loaded {count} embeddings into the in-memory index")
+        
+        embeddings = self._embeddings
+        index = await asyncio.to_thread(self._build_faiss_index, embeddings)
+        # Another reload may have replaced the mirror in the meantime
+        if self._embeddings is embeddings:
+            self._faiss_index = index
+    
+    async def _extend_in_memory_index(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        embeddings: np.ndarray
+    ):
+        """
+        Append newly added documents to the in-memory index
+        
+        Rows go into a preallocated buffer that doubles when full, so adds do
+        not copy the whole matrix or read it back from Chroma. Falls back to a
+        full reload whenever the collection and the mirror disagree on size.
+        """
+        async with self._index_lock:
+            count = self._n = await asyncio.to_thread(self.collection.count)
+            current = len(self._rows)
+            if (
+                self._embeddings is None
+                or count != current + len(ids)
+                or count >= settings.IN_MEMORY_INDEX_MAX_DOCS
+            ):
+                await self._reload_in_memory_index()
+                return
+            
+            new = np.asarray(embeddings, dtype=np.float32)
+            new = new / np.maximum(np.linalg.norm(new, axis=1, keepdims=True), 1e-12)
+            buffer = self._embedding_buffer
+            if buffer is None or len(buffer) < count:
+                # A memory-mapped snapshot is read-only, so the first append copies it too
+                buffer = np.empty((max(count, 2 * current), new.shape[1]), dtype=self._embeddings.dtype)
+                buffer[:current] = self._embeddings
+                self._embedding_buffer = buffer
+            # Rows past the current view are unused, so searches still in flight are unaffected
+            buffer[current:count] = new
+            
+            index, self._faiss_index = self._faiss_index, None
+            self._embeddings = buffer[:count]
+            self._rows = self._rows + [
+                (doc_id, content, metadata or {})
+                for doc_id, content, metadata in zip(ids, documents, metadatas)
+            ]
+            # Rewriting the snapshot costs O(N) per add, so it is saved on cleanup
+            self._snapshot_stale = True
+            
+            embeddings = self._embeddings
+            if index is not None and (
+                current >= settings.FAISS_MIN_DOCS or self._within_quantizer_range(index, new)
+            ):
+                # IVF-PQ centroids stay representative, and new rows inside the
+                # scalar quantizer's trained ranges encode without retraining
+                await asyncio.to_thread(index.add, new)
+            else:
+                index = await asyncio.to_thread(self._build_faiss_index, embeddings)
+            if self._embeddings is embeddings:
+                self._faiss_index = index
+            logger.debug(f"Appended {len(ids)} embeddings to the in-memory index")
+    
+    def _within_quantizer_range(self, index, vectors: np.ndarray) -> bool:
+        """Whether a scalar-quantized index can encode the vectors without retraining"""
+        if not isinstance(index, faiss.IndexScalarQuantizer):
+            return False
+        # Trained as each dimension's minimum followed by its range
+        trained = faiss.vector_to_array(index.sq.trained).reshape(2, -1)
+        low, high = trained[0], trained[0] + trained[1]
+        return bool(np.all(vectors >= low) and np.all(vectors <= high))
+    
+    def _build_faiss_index(self, embeddings: np.ndarray):
+        """
+        Build a FAISS index over the mirror when FAISS is installed
+        
+        Mirrors with at least FAISS_MIN_DOCS rows get an IVF-PQ index: inner
+        product on normalized vectors is cosine similarity, and product
+        quantization shrinks each vector to FAISS_PQ_M bytes. Smaller mirrors
+        are scanned exactly unless IN_MEMORY_INDEX_INT8 opts in to scanning an
+        8-bit scalar-quantized copy, which reads a quarter of the bytes but
+        only approximates the scores and may reorder near ties.
+        """
+        if faiss is None:
+            return None
+        
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        dimension = vectors.shape[1]
+        if len(vectors) < settings.FAISS_MIN_DOCS:
+            if not settings.IN_MEMORY_INDEX_INT8:
+                return None
+            index = faiss.IndexScalarQuantizer(
+                dimension,
+                faiss.ScalarQuantizer.QT_8bit,
+                faiss.METRIC_INNER_PRODUCT
+            )
+            # Learns each dimension's range, so the whole mirror is the training set
+            index.train(vectors)
+            index.add(vectors)
+            logger.debug(f"Built int8 FAISS index over {len(vectors)} embeddings")
+            return index
+        
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFPQ(
+            quantizer,
+            dimension,
+            settings.FAISS_NLIST,
+            settings.FAISS_PQ_M,
+            8,
+            faiss.METRIC_INNER_PRODUCT
+        )
+        # Training cost grows with the sample, and a few hundred rows per list is plenty
+        sample_size = min(len(vectors), settings.FAISS_NLIST * 256)
+        sample = np.random.default_rng(0).choice(len(vectors), sample_size, replace=False)
+        index.train(vectors[np.sort(sample)])
+        index.add(vectors)
+        index.nprobe = settings.FAISS_NPROBE
+        logger.debug(f"Built FAISS IVF-PQ index over {len(vectors)} embeddings")
+        return index
+    
+    def _snapshot_paths(self) -> Tuple[str, str]:
+        """Paths of the saved in-memory index embeddings and rows"""
+        return (
+            os.path.join(settings.CHROMA_PERSIST_DIR, f"{self.collection_name}_{_INDEX_EMBEDDINGS_FILE}"),
+            os.path.join(settings.CHROMA_PERSIST_DIR, f"{self.collection_name}_{_INDEX_ROWS_FILE}")
+        )
+    
+    @staticmethod
+    def _content_checksum(rows: List[Tuple[str, str, Dict[str, Any]]]) -> str:
+        """SHA-256 of the rows' IDs, documents and metadata, independent of row order"""
+        digest = hashlib.sha256()
+        for row in sorted(rows, key=lambda row: row[0]):
+            digest.update(orjson.dumps(row, option=orjson.OPT_SORT_KEYS))
+        return digest.hexdigest()
+    
+    def _snapshot_header(self) -> Dict[str, Any]:
+        """What a snapshot must have been built with to be reused"""
+        return {
+            "model": _embedding_model_id(),
+            "dimension": self.embedding_model.get_sentence_embedding_dimension(),
+            "dtype": settings.IN_MEMORY_INDEX_DTYPE
+        }
+    
+    def _read_index_snapshot(self, count: int) -> Optional[Tuple[np.ndarray, Dict[str, Any]]]:
+        """Memory-map a saved in-memory index whose header and size still match"""
+        embeddings_path, rows_path = self._snapshot_paths()
+        try:
+            embeddings = np.load(embeddings_path, mmap_mode="r")
+            with open(rows_path, "rb") as f:
+                saved = orjson.loads(f.read())
+            header, rows = saved["header"], saved["rows"]
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.debug(f"No usable in-memory index snapshot: {e}")
+            return None
+        expected = self._snapshot_header()
+        if any(header.get(key) != value for key, value in expected.items()):
+            logger.info("In-memory index snapshot was built with other settings, ignoring it")
+            return None
+        if embeddings.shape != (count, expected["dimension"]) or len(rows) != count:
+            return None
+        if embeddings.dtype != np.dtype(settings.IN_MEMORY_INDEX_DTYPE):
+            return None
+        return embeddings, saved
+    
+    async def _load_index_snapshot(self, count: int) -> bool:
+        """Use a saved in-memory index if it was built from the collection's current documents"""
+        snapshot = await asyncio.to_thread(self._read_index_snapshot, count)
+        if snapshot is None:
+            return False
+        embeddings, saved = snapshot
+        rows = [tuple(row) for row in saved["rows"]]
+        # Documents and metadata are small next to the embeddings, so compare
+        # them with Chroma to catch edits that kept the row count
+        results = await asyncio.to_thread(self.collection.get, include=["documents", "metadatas"])
+        current = [
+            (doc_id, content, metadata or {})
+            for doc_id, content, metadata in zip(
+                results['ids'], results['documents'], results['metadatas']
+            )
+        ]
+        checksum = self._content_checksum(rows)
+        if checksum != saved["header"]["content_sha256"] or checksum != self._content_checksum(current):
+            logger.info("In-memory index snapshot is out of date, ignoring it")
+            return False
+        self._embeddings = embeddings
+        self._rows = rows
+        self._snapshot_stale = False
+        return True
+    
+    def _save_index_snapshot(self):
+        """Write the in-memory index next to the Chroma files"""
+        embeddings_path, rows_path = self._snapshot_paths()
+        embeddings, rows = self._embeddings, self._rows
+        self._snapshot_stale = False
+        # Write to temporary files first so a crash never leaves a torn snapshot;
+        # saves can overlap when documents are added concurrently
+        suffix = f".{threading.get_ident()}.tmp"
+        header = {**self._snapshot_header(), "content_sha256": self._content_checksum(rows)}
+        try:
+            with open(embeddings_path + suffix, "wb") as f:
+                np.save(f, embeddings)
+            with open(rows_path + suffix, "wb") as f:
+                f.write(orjson.dumps({"header": header, "rows": rows}))
+            os.replace(embeddings_path + suffix, embeddings_path)
+            os.replace(rows_path + suffix, rows_path)
+        except OSError as e:
+            logger.warning(f"Failed to save in-memory index snapshot: {e}")
+    
+    def _remove_index_snapshot(self):
+        """Delete any saved in-memory index"""
+        self._snapshot_stale = False
+        for path in self._snapshot_paths():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    
+    def _score_all(self, embeddings: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """[Q, N] dot products of queries with every row, upcasting half-precision rows block by block"""
+        if embeddings.dtype == np.float32:
+            return queries @ embeddings.T
+        # numpy has no fast float16 matmul; converting cache-sized blocks keeps
+        # the float16 memory traffic and still runs the product in BLAS
+        scores = np.empty((len(queries), len(embeddings)), dtype=np.float32)
+        for start in range(0, len(embeddings), _SCORE_BLOCK_ROWS):
+            block = embeddings[start:start + _SCORE_BLOCK_ROWS]
+            scores[:, start:start + len(block)] = queries @ block.astype(np.float32).T
+        return scores
+    
+    def _search_in_memory(self, query_embedding: np.ndarray, top_k: int) -> List[Dict[str, Any]]:
+        """Cosine top-k over the in-memory index for one query"""
+        return self._search_in_memory_batch(np.asarray(query_embedding).reshape(1, -1), top_k)[0]
+    
+    def _search_in_memory_batch(self, query_embeddings: np.ndarray, top_k: int) -> List[List[Dict[str, Any]]]:
+        """
+        Cosine top-k over the in-memory index for [Q, D] queries at once
+        
+        Exact scans score every query in one matrix product and take each
+        row's top-k with argpartition; a FAISS index searches all queries in
+        one call. Results are exact unless a FAISS index is built.
+        """
+        embeddings, rows, faiss_index = self._embeddings, self._rows, self._faiss_index
+        queries = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        top_k = min(top_k, len(rows))
+        if top_k == 0:
+            return [[] for _ in range(len(queries))]
+        if faiss_index is not None:
+            distances, indices = faiss_index.search(queries, top_k)
+            # Quantized inner products can overshoot; keep scores valid cosines
+            np.clip(distances, -1.0, 1.0, out=distances)
+            # FAISS pads with -1 when the probed lists hold fewer than top_k rows
+            hits = [
+                (index_row[index_row >= 0], distance_row[index_row >= 0])
+                for index_row, distance_row in zip(indices, distances)
+            ]
+        else:
+            scores = self._score_all(embeddings, queries)
+            if top_k < len(rows):
+                top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+            else:
+                # Every row is returned, so there is nothing to partition away
+                top = np.broadcast_to(np.arange(len(rows)), scores.shape)
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            hits = zip(np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1))
+        return [
+            [
+                {
+                    'content': rows[i][1],
+                    'metadata': rows[i][2],
+                    'score': score,
+                    'id': rows[i][0]
+                }
+                for i, score in zip(top_rows.tolist(), score_rows.tolist())
+            ]
+            for top_rows, score_rows in hits
+        ]
+    
+    def count(self) -> int:
+        """Number of documents in the collection, without a round trip to Chroma"""
+        return self._n
+    
+    async def get_all_documents(self) -> List[Dict[str, Any]]:
+        """Get every stored document with its metadata, ordered by ID"""
+        results = await asyncio.to_thread(self.collection.get, include=["documents", "metadatas"])
+        documents = [
+            {
+                'content': content,
+                'metadata': metadata or {},
+                'id': doc_id
+            }
+            for doc_id, content, metadata in zip(
+                results['ids'], results['documents'], results['metadatas']
+            )
+        ]
+        documents.sort(key=lambda doc: doc['id'])
+        return documents
+    
+    async def warmup(self):
+        """Run a throwaway query so the embedding model and HNSW index are loaded"""
+        if self._n == 0:
+            return
+        try:
+            await self.search("warmup", top_k=1)
+            logger.info("Vector store warmed up")
+        except Exception as e:
+            logger.warning(f"Vector store warmup failed: {e}")
+    
     async def search(
         self,
         query: str,
@@ -88,38 +677,141 @@ class VectorStoreManager:
         filter_metadata: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """Search for similar documents"""
+        if top_k <= 0:
+            return []
         try:
             # Generate query embedding
-            query_embedding = self.embedding_model.encode([query])[0].tolist()
-            
-            # Search
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
+            query_embedding = await self.embed(query)
+        except Exception as e:
+            logger.error(f"Search failed: {e}")
+            return []
+        
+        return await self.search_by_embedding(query_embedding, top_k, filter_metadata)
+    
+    async def search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        filter_metadata: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several queries with one encode pass
+        
+        Unfiltered searches of an in-memory index score all queries in one
+        matrix product; otherwise they are sent to Chroma as one query.
+        """
+        if not queries:
+            return []
+        if top_k <= 0:
+            return [[] for _ in queries]
+        try:
+            query_embeddings = await self.encode_texts(queries)
+            if self._embeddings is not None and filter_metadata is None:
+                return await asyncio.to_thread(self._search_in_memory_batch, query_embeddings, top_k)
+            results = await asyncio.to_thread(
+                self.collection.query,
+                query_embeddings=query_embeddings,
                 n_results=top_k,
                 where=filter_metadata
             )
-            
-            # Format results
-            formatted_results = []
-            if results and results['documents'] and len(results['documents']) > 0:
-                for i in range(len(results['documents'][0])):
-                    formatted_results.append({
-                        'content': results['documents'][0][i],
-                        'metadata': results['metadatas'][0][i] if results['metadatas'] else {},
-                        'score': 1 - results['distances'][0][i] if results['distances'] else 0.0,
-                        'id': results['ids'][0][i]
-                    })
-            
-            return formatted_results
-            
+            return [self._format_results(results, i) for i in range(len(queries))]
+        except Exception as e:
+            logger.error(f"Batch search failed: {e}")
+            return [[] for _ in queries]
+    
+    async def search_by_embedding(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 5,
+        filter_metadata: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Search for documents similar to an already computed query embedding
+        
+        Small collections are searched exactly in memory. Otherwise, queries
+        with the same filter that arrive within VECTOR_QUERY_BATCH_WINDOW_MS of
+        each other are sent to Chroma as one multi-vector query.
+        """
+        if top_k <= 0:
+            return []
+        if self._embeddings is not None and filter_metadata is None:
+            # Small unfiltered collection: scan it directly instead of calling Chroma
+            if len(self._rows) > _INLINE_SEARCH_ROWS:
+                return await asyncio.to_thread(self._search_in_memory, query_embedding, top_k)
+            return self._search_in_memory(query_embedding, top_k)
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = orjson.dumps(filter_metadata, option=orjson.OPT_SORT_KEYS)
+        
+        pending = self._pending_queries.get(key)
+        if pending is None:
+            pending = self._pending_queries[key] = []
+            loop.call_later(
+                settings.VECTOR_QUERY_BATCH_WINDOW_MS / 1000,
+                self._schedule_flush,
+                key,
+                filter_metadata
+            )
+        pending.append((np.asarray(query_embedding, dtype=np.float32).ravel(), top_k, future))
+        
+        return await future
+    
+    def _schedule_flush(self, key: bytes, filter_metadata: Optional[Dict[str, Any]]):
+        # Keep a reference so the task is not garbage collected mid-flight
+        task = asyncio.ensure_future(self._flush_queries(key, filter_metadata))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+    
+    async def _flush_queries(self, key: bytes, filter_metadata: Optional[Dict[str, Any]]):
+        """Run all pending queries for one filter as a single Chroma query"""
+        pending = self._pending_queries.pop(key, [])
+        if not pending:
+            return
+        
+        try:
+            # Search
+            results = await asyncio.to_thread(
+                self.collection.query,
+                query_embeddings=np.stack([embedding for embedding, _, _ in pending]),
+                n_results=max(top_k for _, top_k, _ in pending),
+                where=filter_metadata
+            )
+            for i, (_, top_k, future) in enumerate(pending):
+                if not future.done():
+                    future.set_result(self._format_results(results, i)[:top_k])
+                    
         except Exception as e:
             logger.error(f"Search failed: {e}")
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_result([])
+    
+    def _format_results(self, results: Dict[str, Any], index: int) -> List[Dict[str, Any]]:
+        """Format the results of one query from a (multi-vector) Chroma query"""
+        if not results or not results['documents'] or len(results['documents']) <= index:
             return []
+        
+        docs = results['documents'][index]
+        metas = results['metadatas'][index] if results.get('metadatas') else [{}] * len(docs)
+        dists = results['distances'][index] if results.get('distances') else [1.0] * len(docs)
+        ids = results['ids'][index]
+        return [
+            {'content': doc, 'metadata': meta or {}, 'score': 1.0 - dist, 'id': doc_id}
+            for doc, meta, dist, doc_id in zip(docs, metas, dists, ids)
+        ]
     
     async def delete_collection(self):
         """Delete the collection"""
         try:
-            self.client.delete_collection(name="code_docs")
+            await asyncio.to_thread(self.client.delete_collection, name=self.collection_name)
+            self.version += 1
+            self._embeddings = None
+            self._rows = []
+            self._faiss_index = None
+            self._embedding_buffer = None
+            self._n = 0
+            self._remove_index_snapshot()
             logger.info("Collection deleted")
         except Exception as e:
             logger.error(f"Failed to delete collection: {e}")
@@ -127,4 +819,8 @@ class VectorStoreManager:
     async def cleanup(self):
         """Cleanup resources"""
         logger.info("Cleaning up vector store...")
+        if self._snapshot_stale and self._embeddings is not None:
+            await asyncio.to_thread(self._save_index_snapshot)
+        if self._document_cache is not None:
+            self._document_cache.close()
         # ChromaDB client cleanup happens automatically
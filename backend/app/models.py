@@ -4,8 +4,10 @@ Data models and schemas
 
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any, Literal
+from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
+import msgspec
 
 
 class AgentType(str, Enum):
@@ -53,14 +55,35 @@ class ChatResponse(BaseModel):
     execution_time: float
 
 
-class AgentStep(BaseModel):
-    """Single agent execution step"""
+@dataclass(frozen=True)
+class AgentStep:
+    """Single agent execution step (internal; serialized as AgentStepMsg)"""
+    __slots__ = ("agent_type", "input", "output", "tools_used", "thinking", "timestamp")
+    
     agent_type: AgentType
     input: str
     output: str
-    tools_used: List[str] = []
-    thinking: Optional[str] = None
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    tools_used: List[str]
+    thinking: Optional[str]
+    timestamp: datetime
+
+
+class AgentStepMsg(msgspec.Struct, frozen=True):
+    """Agent step as serialized in API responses"""
+    agent: str
+    input: str
+    output: str
+    tools_used: List[str]
+    timestamp: datetime
+
+
+class ChatResponseMsg(msgspec.Struct):
+    """Chat response encoded directly with msgspec on the hot path"""
+    response: str
+    conversation_id: str
+    agent_trace: List[AgentStepMsg]
+    execution_time: float
+    sources: Optional[List[Dict[str, Any]]] = None
 
 
 class CodeExecutionRequest(BaseModel):
@@ -83,6 +106,7 @@ class DocumentChunk(BaseModel):
     content: str
     metadata: Dict[str, Any]
     score: Optional[float] = None
+    id: Optional[str] = None
 
 
 class RAGQuery(BaseModel):
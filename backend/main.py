@@ -6,15 +6,31 @@ FastAPI backend for orchestrating AI agents with RAG capabilities
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from typing import Dict
 import uvicorn
 from loguru import logger
 import sys
 
 from app.config import settings
 from app.api import chat, agents, tools, health
+from app.core.llm_provider import close_llm_providers, get_llm_provider
 from app.core.rag_system import RAGSystem
+from app.core.tools import CodeExecutor
 from app.core.vector_store import VectorStoreManager
 
+# Faster event loop and HTTP parser when available (uvloop does not support Windows)
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+try:
+    import httptools  # noqa: F401
+    HTTP_IMPLEMENTATION = "httptools"
+except ImportError:
+    HTTP_IMPLEMENTATION = "h11"
+
+
 # Configure logging
 logger.remove()
 logger.add(
@@ -35,14 +51,28 @@ async def lifespan(app: FastAPI):
     
     logger.info("🚀 Starting Multi-Agent Code Assistant...")
     
+    # Fork code execution workers before the embedding model starts threads
+    CodeExecutor.start_pool(settings.CODE_EXECUTOR_WORKERS, settings.CODE_EXECUTOR_MEMORY_MB)
+    
     # Initialize vector store
     logger.info("📊 Initializing vector database...")
     vector_store = VectorStoreManager()
     await vector_store.initialize()
+    await vector_store.warmup()
     
     # Initialize RAG system
     logger.info("🧠 Initializing RAG system...")
     rag_system = RAGSystem(vector_store)
+    if settings.CAG_ENABLE:
+        await rag_system.load_cag_context()
+    chat.set_rag_system(rag_system)
+    
+    # Create the shared LLM client and its connection pool before the first request
+    logger.info("🤖 Warming up LLM provider...")
+    try:
+        get_llm_provider()
+    except Exception as e:
+        logger.warning(f"LLM provider warmup failed: {e}")
     
     logger.info("✅ Application startup complete!")
     
@@ -52,6 +82,9 @@ async def lifespan(app: FastAPI):
     logger.info("🔄 Shutting down application...")
     if vector_store:
         await vector_store.cleanup()
+    await chat.exact_cache.close()
+    await close_llm_providers()
+    CodeExecutor.shutdown_pool()
     logger.info("👋 Shutdown complete!")
 
 
@@ -80,7 +113,7 @@ app.include_router(tools.router, prefix="/api/v1", tags=["Tools"])
 
 
 @app.get("/")
-async def root():
+async def root() -> Dict[str, str]:
     """Root endpoint"""
     return {
         "message": "Multi-Agent Code Assistant API",
@@ -111,5 +144,7 @@ if __name__ == "__main__":
         host=settings.HOST,
         port=settings.PORT,
         reload=settings.DEBUG,
+        loop="uvloop" if uvloop else "asyncio",
+        http=HTTP_IMPLEMENTATION,
         log_level="info"
     )
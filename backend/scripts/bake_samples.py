@@ -0,0 +1,61 @@
+"""
+Precompute embeddings for the sample documents
+
+Writes sample_embeddings.npy and sample_meta.json next to init_vectordb.py so
+that initializing the vector database does not have to run the embedding model.
+Re-run whenever SAMPLE_DOCUMENTS or the embedding model settings change.
+"""
+
+import json
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.core.vector_store import _embedding_model_id, _get_model
+from init_vectordb import (
+    SAMPLE_DOCUMENTS,
+    SAMPLE_EMBEDDINGS_PATH,
+    SAMPLE_META_PATH,
+    content_hashes
+)
+from loguru import logger
+import numpy as np
+
+
+def main():
+    """Embed the sample documents and save them with their metadata"""
+    # Same model loader as VectorStoreManager, so the backend and precision match too
+    model = _get_model(
+        settings.EMBEDDING_MODEL,
+        settings.EMBEDDING_BACKEND,
+        settings.EMBEDDING_ONNX_FILE
+    )
+    
+    # Same options as VectorStoreManager uses, so baked and live embeddings agree
+    embeddings = model.encode(
+        [doc["content"] for doc in SAMPLE_DOCUMENTS],
+        batch_size=settings.EMBEDDING_BATCH_SIZE,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    )
+    
+    np.save(SAMPLE_EMBEDDINGS_PATH, embeddings.astype(np.float32))
+    with open(SAMPLE_META_PATH, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "model": _embedding_model_id(),
+                "content_sha256": content_hashes(SAMPLE_DOCUMENTS)
+            },
+            f,
+            indent=2
+        )
+    
+    logger.info(f"✅ Baked {len(embeddings)} sample embeddings to {SAMPLE_EMBEDDINGS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
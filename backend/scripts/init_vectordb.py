@@ -1,19 +1,40 @@
 """
 Initialize vector database with sample documentation
+
+Warm re-runs do not tokenize or encode the samples: baked embeddings from
+bake_samples.py are used when they are current, and otherwise each document's
+embedding comes from the on-disk embedding cache filled by the first run.
 """
 
 import asyncio
+import hashlib
+import json
 import sys
 import os
+import textwrap
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.core.vector_store import VectorStoreManager
+from app.core.vector_store import VectorStoreManager, _embedding_model_id
 from loguru import logger
+import numpy as np
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
-SAMPLE_DOCUMENTS = [
+
+# Sample batches added to the vector store at the same time
+ADD_CONCURRENCY = 4
+
+# Embeddings baked by bake_samples.py, used when they match the documents and model
+SAMPLE_EMBEDDINGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_embeddings.npy")
+SAMPLE_META_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_meta.json")
+
+_RAW_SAMPLE_DOCUMENTS = [
     {
         "content": """
 # FastAPI Basics
@@ -244,6 +265,54 @@ async def safe_fetch(url):
     }
 ]
 
+# Dedented and stripped once here, so padding whitespace is never embedded
+SAMPLE_DOCUMENTS = [
+    {"content": textwrap.dedent(doc["content"]).strip(), "metadata": doc["metadata"]}
+    for doc in _RAW_SAMPLE_DOCUMENTS
+]
+
+
+def batched(
+    docs: List[Dict[str, Any]],
+    n: int = 64,
+    start_id: int = 0
+) -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]]]]:
+    """
+    Yield (ids, contents, metadatas) batches of at most ``n`` documents
+    
+    Documents are sorted longest first so each batch holds texts of similar
+    length and the embedder pads as little as possible. IDs follow the
+    original document order.
+    """
+    order = sorted(range(len(docs)), key=lambda i: len(docs[i]["content"]), reverse=True)
+    for start in range(0, len(order), n):
+        batch = order[start:start + n]
+        yield (
+            [f"doc_{start_id + i}" for i in batch],
+            [docs[i]["content"] for i in batch],
+            [docs[i]["metadata"] for i in batch]
+        )
+
+
+def content_hashes(docs: List[Dict[str, Any]]) -> List[str]:
+    """SHA-256 of each document's content, used to tell whether baked embeddings are stale"""
+    return [hashlib.sha256(doc["content"].encode("utf-8")).hexdigest() for doc in docs]
+
+
+def load_precomputed() -> Optional[np.ndarray]:
+    """Load baked sample embeddings if they match the current documents and model"""
+    try:
+        with open(SAMPLE_META_PATH, encoding="utf-8") as f:
+            meta = json.load(f)
+        embeddings = np.load(SAMPLE_EMBEDDINGS_PATH)
+    except (OSError, ValueError):
+        return None
+    
+    if meta.get("model") != _embedding_model_id() or meta.get("content_sha256") != content_hashes(SAMPLE_DOCUMENTS):
+        logger.warning("Baked sample embeddings are stale, re-run scripts/bake_samples.py")
+        return None
+    return embeddings
+
 
 async def main():
     """Initialize vector database with sample documents"""
@@ -254,14 +323,31 @@ async def main():
     await vector_store.initialize()
     
     # Add sample documents
-    documents = [doc["content"] for doc in SAMPLE_DOCUMENTS]
-    metadatas = [doc["metadata"] for doc in SAMPLE_DOCUMENTS]
-    
-    logger.info(f"Adding {len(documents)} sample documents...")
-    await vector_store.add_documents(documents, metadatas)
+    logger.info(f"Adding {len(SAMPLE_DOCUMENTS)} sample documents...")
+    start_id = vector_store.count()
+    precomputed = load_precomputed()
+    if precomputed is not None:
+        logger.info("Using baked sample embeddings")
+        await vector_store.add_precomputed(
+            precomputed,
+            [doc["content"] for doc in SAMPLE_DOCUMENTS],
+            [doc["metadata"] for doc in SAMPLE_DOCUMENTS],
+            ids=[f"doc_{start_id + i}" for i in range(len(SAMPLE_DOCUMENTS))]
+        )
+    else:
+        # IDs are assigned up front, so batches can be added concurrently
+        semaphore = asyncio.Semaphore(ADD_CONCURRENCY)
+        
+        async def add_batch(ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]):
+            async with semaphore:
+                await vector_store.add_documents(documents, metadatas, ids=ids)
+        
+        await asyncio.gather(*(
+            add_batch(*batch) for batch in batched(SAMPLE_DOCUMENTS, n=64, start_id=start_id)
+        ))
     
     logger.info("✅ Vector database initialized successfully!")
-    logger.info(f"Total documents: {vector_store.collection.count()}")
+    logger.info(f"Total documents: {vector_store.count()}")
     
     # Test search
     logger.info("\nTesting search functionality...")
@@ -272,7 +358,13 @@ async def main():
         logger.info(f"\n{i}. Score: {result['score']:.3f}")
         logger.info(f"   Source: {result['metadata'].get('source', 'Unknown')}")
         logger.info(f"   Preview: {result['content'][:100]}...")
+    
+    # Saves the in-memory index snapshot for the next startup
+    await vector_store.cleanup()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
@@ -0,0 +1,96 @@
+"""
+Shared test fixtures
+"""
+
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import pytest
+import pytest_asyncio
+from app.core.agents import BaseAgent, create_agent
+from app.core.llm_provider import LLMProvider
+from app.core.vector_store import VectorStoreManager
+from app.models import AgentType
+
+
+class StubProvider(LLMProvider):
+    """Answers every task with a canned reply, without calling an LLM"""
+    
+    def __init__(self, chunks: Optional[List[str]] = None, fail_on: Optional[str] = None):
+        self.chunks = chunks if chunks is not None else ["Hello", ", ", "world"]
+        self.fail_on = fail_on
+        self.calls: List[List[Dict[str, str]]] = []
+    
+    async def generate(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        tools: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        self.calls.append(messages)
+        task = messages[-1]["content"]
+        if self.fail_on is not None and self.fail_on in task:
+            raise RuntimeError(f"Stub failure on: {task}")
+        return {"content": f"Answer to: {task}"}
+    
+    async def generate_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 2000
+    ) -> AsyncIterator[str]:
+        self.calls.append(messages)
+        for chunk in self.chunks:
+            yield chunk
+
+
+class AgentPool:
+    """
+    Reusable agents per type
+    
+    Agents are handed out by ``acquire`` and come back with their history
+    cleared, so each holder starts from a fresh conversation without paying
+    for agent construction again.
+    """
+    
+    def __init__(self):
+        self._idle: Dict[AgentType, List[BaseAgent]] = {}
+    
+    @asynccontextmanager
+    async def acquire(self, agent_type: AgentType) -> AsyncIterator[BaseAgent]:
+        """Borrow an idle agent of a type, creating one if none is free"""
+        idle = self._idle.get(agent_type)
+        agent = idle.pop() if idle else create_agent(agent_type)
+        try:
+            yield agent
+        finally:
+            self.release(agent)
+    
+    def release(self, agent: BaseAgent):
+        """Return an agent to the pool with a clean history"""
+        agent.reset_history()
+        self._idle.setdefault(agent.agent_type, []).append(agent)
+
+
+@pytest.fixture
+def stub_provider():
+    """Provider with canned replies, for tests that must not reach an LLM"""
+    return StubProvider()
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def agent_pool():
+    """Agents shared across tests, handed out with a clean history"""
+    return AgentPool()
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def vector_store():
+    """Vector store initialized once per session, on a throwaway collection"""
+    manager = VectorStoreManager(collection_name=f"test_{uuid.uuid4().hex}")
+    await manager.initialize()
+    yield manager
+    await manager.delete_collection()
+    await manager.cleanup()
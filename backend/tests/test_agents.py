@@ -3,55 +3,128 @@ Simple test to verify the multi-agent system works
 """
 
 import pytest
-from app.core.agents import create_agent, AgentType
+from app.config import settings
+from app.core.agents import AgentType, create_agent
 from app.models import AgentStep
 
 
-@pytest.mark.asyncio
-async def test_planner_agent():
+@pytest.mark.asyncio(loop_scope="session")
+async def test_planner_agent(agent_pool):
     """Test planner agent execution"""
-    planner = create_agent(AgentType.PLANNER)
-    
-    step = await planner.execute(
-        task="Create a plan to build a REST API"
-    )
+    async with agent_pool.acquire(AgentType.PLANNER) as planner:
+        step = await planner.execute(
+            task="Create a plan to build a REST API"
+        )
     
     assert isinstance(step, AgentStep)
     assert step.agent_type == AgentType.PLANNER
     assert len(step.output) > 0
 
 
-@pytest.mark.asyncio
-async def test_coder_agent():
+@pytest.mark.asyncio(loop_scope="session")
+async def test_coder_agent(agent_pool):
     """Test coder agent execution"""
-    coder = create_agent(AgentType.CODER)
-    
-    step = await coder.execute(
-        task="Write a Python function to calculate factorial"
-    )
+    async with agent_pool.acquire(AgentType.CODER) as coder:
+        step = await coder.execute(
+            task="Write a Python function to calculate factorial"
+        )
     
     assert isinstance(step, AgentStep)
     assert step.agent_type == AgentType.CODER
     assert "def" in step.output  # Should contain function definition
 
 
-@pytest.mark.asyncio
-async def test_agent_conversation_history():
+@pytest.mark.asyncio(loop_scope="session")
+async def test_agent_conversation_history(agent_pool):
     """Test that agents maintain conversation history"""
-    agent = create_agent(AgentType.PLANNER)
+    async with agent_pool.acquire(AgentType.PLANNER) as agent:
+        # Pooled agents start from a clean history
+        assert len(agent.conversation_history) == 0
+        
+        # First interaction
+        await agent.execute(task="Hello")
+        assert len(agent.conversation_history) == 2  # user + assistant
+        
+        # Second interaction
+        await agent.execute(task="Remember what I said?")
+        assert len(agent.conversation_history) == 4
+        
+        # Reset
+        agent.reset_history()
+        assert len(agent.conversation_history) == 0
+
+
+@pytest.mark.asyncio
+async def test_execute_parallel_records_results_in_task_order(stub_provider):
+    """Test parallel tasks see the same history and are recorded in task order"""
+    agent = create_agent(AgentType.CODER, llm_provider=stub_provider)
     
-    # First interaction
-    await agent.execute(task="Hello")
-    assert len(agent.conversation_history) == 2  # user + assistant
+    steps = await agent.execute_parallel([("first", None), ("second", None)])
     
-    # Second interaction
-    await agent.execute(task="Remember what I said?")
-    assert len(agent.conversation_history) == 4
+    assert [step.output for step in steps] == ["Answer to: first", "Answer to: second"]
+    assert [message["content"] for message in agent.conversation_history] == [
+        "first", "Answer to: first", "second", "Answer to: second"
+    ]
+    # Neither call saw the other's turn
+    assert all(len(messages) == 2 for messages in stub_provider.calls)
+
+
+@pytest.mark.asyncio
+async def test_execute_parallel_failure_leaves_history_untouched(stub_provider):
+    """Test a failing task raises and no step of the batch is recorded"""
+    stub_provider.fail_on = "second"
+    agent = create_agent(AgentType.CODER, llm_provider=stub_provider)
+    
+    with pytest.raises(RuntimeError):
+        await agent.execute_parallel([("first", None), ("second", None), ("third", None)])
     
-    # Reset
-    agent.reset_history()
     assert len(agent.conversation_history) == 0
 
 
+@pytest.mark.asyncio
+async def test_history_overflow_is_folded_into_summary(stub_provider, monkeypatch):
+    """Test turns pushed out of the bounded history end up in the rolling summary"""
+    monkeypatch.setattr(settings, "AGENT_HISTORY_MAX_MESSAGES", 4)
+    monkeypatch.setattr(settings, "AGENT_HISTORY_SUMMARY_BATCH", 2)
+    agent = create_agent(AgentType.PLANNER, llm_provider=stub_provider)
+    
+    for i in range(3):
+        await agent.execute(task=f"task {i}")
+    
+    # The oldest turn was evicted and summarized; the deque kept its bound
+    assert len(agent.conversation_history) == 4
+    assert agent.conversation_history[0]["content"] == "task 1"
+    assert agent._evicted_messages == []
+    assert "task 0" in agent._rolling_summary
+    assert "Answer to: task 0" in agent._rolling_summary
+    
+    # The next prompt carries the summary ahead of the remaining history
+    await agent.execute(task="task 3")
+    messages = next(call for call in stub_provider.calls if call[-1]["content"] == "task 3")
+    assert any("Summary of earlier conversation" in message["content"] for message in messages)
+    assert [message["content"] for message in messages[-5:]] == [
+        "task 1", "Answer to: task 1", "task 2", "Answer to: task 2", "task 3"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_execute_stream_yields_chunks_then_records_turn(stub_provider):
+    """Test streamed chunks arrive in order and the finished turn is recorded"""
+    agent = create_agent(AgentType.CODER, llm_provider=stub_provider)
+    completed = []
+    
+    chunks = [
+        chunk async for chunk in agent.execute_stream(task="Say hello", on_complete=completed.append)
+    ]
+    
+    assert chunks == ["Hello", ", ", "world"]
+    assert len(completed) == 1
+    assert completed[0].output == "Hello, world"
+    assert list(agent.conversation_history) == [
+        {"role": "user", "content": "Say hello"},
+        {"role": "assistant", "content": "Hello, world"}
+    ]
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
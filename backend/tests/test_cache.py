@@ -0,0 +1,107 @@
+"""
+Test response caches
+"""
+
+import numpy as np
+import pytest
+from app.core.cache import (
+    EmbeddingCache,
+    ExactResponseCache,
+    SemanticResponseCache,
+    MinHashLSH,
+    SmartRAGCache,
+    diskcache
+)
+
+
+def test_semantic_cache_hit_on_near_duplicate():
+    """Test near-duplicate embeddings return the cached value"""
+    cache = SemanticResponseCache(similarity_threshold=0.95)
+    vec = np.random.default_rng(1).standard_normal(384)
+    
+    cache.put("ns", vec, "answer")
+    
+    assert cache.get("ns", vec + 0.01) == "answer"
+    assert cache.get("other", vec) is None
+    assert cache.get("ns", -vec) is None
+
+
+def test_semantic_cache_eviction():
+    """Test LRU and TTL eviction"""
+    cache = SemanticResponseCache(max_size=2)
+    rng = np.random.default_rng(2)
+    vecs = [rng.standard_normal(32) for _ in range(3)]
+    
+    for i, vec in enumerate(vecs):
+        cache.put("ns", vec, i)
+    
+    assert len(cache) == 2
+    assert cache.get("ns", vecs[0]) is None
+    assert cache.get("ns", vecs[2]) == 2
+    
+    expired = SemanticResponseCache(ttl=0)
+    expired.put("ns", vecs[0], "stale")
+    assert expired.get("ns", vecs[0]) is None
+    assert len(expired) == 0
+
+
+def test_exact_cache_key_normalization():
+    """Test exact cache keys ignore case and whitespace but not options"""
+    cache = ExactResponseCache()
+    
+    key = cache.make_key("Write a  Function\n", True, "gpt-4o")
+    
+    assert key == cache.make_key("write a function", True, "gpt-4o")
+    assert key != cache.make_key("write a function", False, "gpt-4o")
+
+
+def test_rag_cache_exact_and_semantic_hits():
+    """Test RAG cache lookups by normalized query and by similar embedding"""
+    cache = SmartRAGCache(similarity_threshold=0.95)
+    vec = np.random.default_rng(3).standard_normal(64)
+    vec /= np.linalg.norm(vec)
+    
+    key, params = cache.make_keys("How do I  use FastAPI?", 5, None)
+    cache.put(key, params, vec, ["chunk"])
+    
+    assert cache.get(cache.make_keys("how do i use fastapi?", 5, None)[0]) == ["chunk"]
+    assert cache.get(cache.make_keys("how do i use fastapi?", 3, None)[0]) is None
+    
+    _, other_params = cache.make_keys("fastapi usage", 3, None)
+    assert cache.get_similar(params, vec) == ["chunk"]
+    assert cache.get_similar(other_params, vec) is None
+    assert cache.get_similar(params, -vec) is None
+
+
+@pytest.mark.skipif(diskcache is None, reason="diskcache not installed")
+def test_embedding_cache_persists_by_content_and_model(tmp_path):
+    """Test embeddings survive reopening and are keyed by stripped content and model"""
+    cache = EmbeddingCache(str(tmp_path), "model-a")
+    cache.put(cache.make_key("def f(): pass"), np.ones(4))
+    cache.close()
+    
+    cache = EmbeddingCache(str(tmp_path), "model-a")
+    embeddings, missing = cache.find_uncached_texts(["  def f(): pass\n", "other"])
+    assert missing == [1]
+    assert np.array_equal(embeddings[0], np.ones(4, dtype=np.float32))
+    
+    other_model = EmbeddingCache(str(tmp_path), "model-b")
+    assert other_model.find_uncached_texts(["def f(): pass"])[1] == [0]
+
+
+@pytest.mark.skipif(diskcache is None or MinHashLSH is None, reason="diskcache or datasketch not installed")
+def test_embedding_cache_reuses_near_duplicates(tmp_path):
+    """Test a trivially edited document reuses the stored embedding after reopening"""
+    document = "\n".join(f"value_{i} = compute({i}, scale={i * 7})" for i in range(100))
+    cache = EmbeddingCache(str(tmp_path), "model-a")
+    cache.put(cache.make_key(document), np.ones(4), content=document)
+    cache.close()
+    
+    cache = EmbeddingCache(str(tmp_path), "model-a")
+    embeddings, missing = cache.find_uncached_texts([document.replace("value_50 =", "value_50  ="), "print('hello')"])
+    assert missing == [1]
+    assert np.array_equal(embeddings[0], np.ones(4, dtype=np.float32))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,122 @@
+"""
+Test chat endpoints
+"""
+
+import numpy as np
+import orjson
+import pytest
+from app.api import chat
+from app.core.cache import SemanticResponseCache
+from app.core.agents import create_agent
+from app.core.orchestrator import AgentOrchestrator
+from app.models import AgentType, ChatRequest
+
+
+def make_orchestrator(provider) -> AgentOrchestrator:
+    """Orchestrator whose agents answer from the given provider"""
+    orchestrator = AgentOrchestrator()
+    orchestrator.agents = {
+        agent_type: create_agent(agent_type, llm_provider=provider) for agent_type in AgentType
+    }
+    return orchestrator
+
+
+@pytest.fixture
+def conversations(stub_provider, monkeypatch):
+    """Register fresh stub-backed conversations and an in-memory exact cache"""
+    store = {}
+    
+    async def get(key):
+        return store.get(key)
+    
+    async def set_(key, value):
+        store[key] = value
+    
+    monkeypatch.setattr(chat.exact_cache, "get", get)
+    monkeypatch.setattr(chat.exact_cache, "set", set_)
+    monkeypatch.setattr(chat.settings, "SEMANTIC_CACHE_ENABLED", False)
+    for conversation_id in ("a", "b"):
+        monkeypatch.setitem(chat.orchestrators, conversation_id, make_orchestrator(stub_provider))
+    return chat.orchestrators
+
+
+@pytest.mark.asyncio
+async def test_exact_cache_only_answers_first_turns(conversations, stub_provider):
+    """Test cached answers start conversations, are remembered, and never answer follow-ups"""
+    message = "Write a function that adds two numbers"
+    
+    first = orjson.loads((await chat.chat(ChatRequest(message=message, conversation_id="a", use_rag=False))).body)
+    calls = len(stub_provider.calls)
+    
+    # Same first message in another conversation is served from the cache...
+    cached = orjson.loads((await chat.chat(ChatRequest(message=message, conversation_id="b", use_rag=False))).body)
+    assert len(stub_provider.calls) == calls
+    assert cached["response"] == first["response"]
+    assert cached["conversation_id"] == "b"
+    # ...and recorded, so a follow-up in that conversation sees it
+    assert conversations["b"].has_history()
+    
+    # A conversation with history never gets a cached answer
+    await chat.chat(ChatRequest(message=message, conversation_id="a", use_rag=False))
+    assert len(stub_provider.calls) > calls
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_only_answers_first_turns(conversations, stub_provider, monkeypatch):
+    """Test near-duplicate answers are remembered and never answer follow-ups"""
+    class Embedder:
+        async def embed(self, text):
+            # Every prompt looks like a near duplicate of every other
+            return np.ones(8)
+    
+    class RAG:
+        vector_store = Embedder()
+    
+    async def get_rag_system():
+        return RAG()
+    
+    monkeypatch.setattr(chat.settings, "EXACT_CACHE_ENABLED", False)
+    monkeypatch.setattr(chat.settings, "SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(chat, "get_rag_system", get_rag_system)
+    monkeypatch.setattr(chat, "response_cache", SemanticResponseCache())
+    
+    first = orjson.loads((await chat.chat(ChatRequest(message="Write a sort function", conversation_id="a", use_rag=False))).body)
+    calls = len(stub_provider.calls)
+    
+    cached = orjson.loads((await chat.chat(ChatRequest(message="Write a sorting function", conversation_id="b", use_rag=False))).body)
+    assert len(stub_provider.calls) == calls
+    assert cached["response"] == first["response"]
+    assert conversations["b"].has_history()
+    
+    await chat.chat(ChatRequest(message="and now in Rust?", conversation_id="a", use_rag=False))
+    assert len(stub_provider.calls) > calls
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_events(conversations):
+    """Test the stream sends ordered deltas, then the trace, and records the turns"""
+    response = await chat.chat_stream(
+        ChatRequest(message="Write a function that adds two numbers", conversation_id="a", use_rag=False)
+    )
+    events = [
+        orjson.loads(line[len("data: "):])
+        async for message in response.body_iterator
+        for line in message.splitlines()
+        if line.startswith("data: ")
+    ]
+    
+    *deltas, final = events
+    text = "".join(event["delta"] for event in deltas)
+    assert text == (
+        "## Execution Plan\n\nHello, world"
+        "\n\n## Implementation\n\nHello, world"
+        "\n\n## Code Review\n\nHello, world"
+    )
+    assert final["conversation_id"] == "a"
+    assert [step["agent"] for step in final["agent_trace"]] == ["planner", "coder", "reviewer"]
+    assert final["sources"] == []
+    assert conversations["a"].has_history()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,62 @@
+"""
+Test LLM provider selection
+"""
+
+import asyncio
+
+import pytest
+from app.core import llm_provider
+
+
+class FakeOpenAI:
+    def __init__(self, model: str):
+        self.model = model
+
+
+class FakeAnthropic(FakeOpenAI):
+    pass
+
+
+@pytest.fixture
+def fake_providers(monkeypatch):
+    """Swap the provider classes for fakes that need no API keys"""
+    monkeypatch.setattr(llm_provider, "_PREFIX_MAP", (
+        ("gpt", FakeOpenAI),
+        ("claude", FakeAnthropic),
+    ))
+    monkeypatch.setattr(llm_provider, "OpenAIProvider", FakeOpenAI)
+    llm_provider._providers.clear()
+    yield
+    llm_provider._providers.clear()
+
+
+@pytest.mark.parametrize("model, provider_cls", [
+    ("gpt-4o", FakeOpenAI),
+    ("GPT-4o", FakeOpenAI),
+    ("claude-3-5-sonnet", FakeAnthropic),
+    ("Claude-3-5-Sonnet", FakeAnthropic),
+])
+def test_provider_matched_case_insensitively(fake_providers, model, provider_cls):
+    """Test model names pick their provider regardless of case, keeping the name as given"""
+    provider = llm_provider.get_llm_provider(model)
+    
+    assert type(provider) is provider_cls
+    assert provider.model == model
+
+
+def test_provider_shared_within_loop(fake_providers):
+    """Test each event loop gets its own provider, reused for repeated lookups"""
+    async def lookup():
+        return llm_provider.get_llm_provider("gpt-4o"), llm_provider.get_llm_provider("gpt-4o")
+    
+    first, again = asyncio.run(lookup())
+    second, _ = asyncio.run(lookup())
+    
+    assert first is again
+    assert first is not second
+    # The closed first loop's providers were forgotten
+    assert len(llm_provider._providers) == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
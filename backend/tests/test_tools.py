@@ -0,0 +1,96 @@
+"""
+Test tool execution
+"""
+
+import asyncio
+import sys
+import threading
+import types
+
+import pytest
+from app.core import tools
+from app.core.tools import CodeExecutor
+
+
+@pytest.mark.asyncio
+async def test_code_executor_pool():
+    """Test code runs in the worker pool and runaway code times out"""
+    CodeExecutor.start_pool(max_workers=1)
+    try:
+        result = await CodeExecutor.execute_python("print(sum(range(10)))")
+        assert result["success"]
+        assert result["output"] == "45\n"
+        
+        result = await CodeExecutor.execute_python("while True: pass", timeout=1)
+        assert not result["success"]
+        assert "timed out" in result["error"]
+        
+        # The stuck worker is replaced and the pool keeps serving requests
+        result = await CodeExecutor.execute_python("print('ok')")
+        assert result["output"] == "ok\n"
+    finally:
+        CodeExecutor.shutdown_pool()
+
+
+@pytest.mark.asyncio
+async def test_code_executor_timeout_spares_other_jobs():
+    """Test a timed-out job replaces only its own worker"""
+    CodeExecutor.start_pool(max_workers=2)
+    try:
+        stuck, other = await asyncio.gather(
+            CodeExecutor.execute_python("while True: pass", timeout=1),
+            CodeExecutor.execute_python("x = 0\nfor i in range(20_000_000): x += i\nprint('done')", timeout=10)
+        )
+        assert "timed out" in stuck["error"]
+        assert other["success"]
+        assert other["output"] == "done\n"
+        assert len(CodeExecutor.workers) == 2
+    finally:
+        CodeExecutor.shutdown_pool()
+
+
+@pytest.mark.skipif(tools.resource is None, reason="resource limits are Unix-only")
+def test_cpu_limit_grants_full_allowance(monkeypatch):
+    """Test CPU time already used is rounded up, so a job near its limit is not killed early"""
+    limits = []
+    
+    class Usage:
+        ru_utime = 0.9
+        ru_stime = 0.05
+    
+    monkeypatch.setattr(tools.resource, "getrusage", lambda who: Usage)
+    monkeypatch.setattr(tools.resource, "setrlimit", lambda kind, limit: limits.append(limit))
+    
+    result = tools._run_python("print('ok')", cpu_seconds=5)
+    
+    assert result["output"] == "ok\n"
+    soft, _ = limits[0]
+    assert soft - (Usage.ru_utime + Usage.ru_stime) >= 5
+
+
+@pytest.mark.asyncio
+async def test_web_searches_run_concurrently(monkeypatch):
+    """Test searches do not wait on each other, each on its own pooled client"""
+    # Both searches must be inside text() at once to pass the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    
+    class FakeDDGS:
+        def text(self, query, max_results):
+            barrier.wait()
+            return [{"title": query, "href": "https://example.com", "body": ""}]
+    
+    monkeypatch.setitem(sys.modules, "duckduckgo_search", types.SimpleNamespace(DDGS=FakeDDGS))
+    monkeypatch.setattr(tools.WebSearch, "_idle_clients", [])
+    
+    first, second = await asyncio.gather(
+        tools.WebSearch.search("first"),
+        tools.WebSearch.search("second")
+    )
+    
+    assert first["success"] and second["success"]
+    assert first["results"][0]["title"] == "first"
+    assert len(tools.WebSearch._idle_clients) == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -2,27 +2,26 @@
 Test vector store functionality
 """
 
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
 import pytest
+from app.core import vector_store as vector_store_module
 from app.core.vector_store import VectorStoreManager
 
 
-@pytest.mark.asyncio
-async def test_vector_store_initialization():
+@pytest.mark.asyncio(loop_scope="session")
+async def test_vector_store_initialization(vector_store):
     """Test vector store can be initialized"""
-    vector_store = VectorStoreManager()
-    await vector_store.initialize()
-    
     assert vector_store.client is not None
     assert vector_store.collection is not None
     assert vector_store.embedding_model is not None
 
 
-@pytest.mark.asyncio
-async def test_add_and_search_documents():
+@pytest.mark.asyncio(loop_scope="session")
+async def test_add_and_search_documents(vector_store):
     """Test adding documents and searching"""
-    vector_store = VectorStoreManager()
-    await vector_store.initialize()
-    
     # Add test documents
     documents = [
         "Python is a programming language",
@@ -44,5 +43,98 @@ async def test_add_and_search_documents():
     assert any("FastAPI" in r["content"] for r in results)
 
 
+@pytest.mark.asyncio(loop_scope="session")
+async def test_search_batch_matches_single_searches(vector_store):
+    """Test batched search returns the same results as one search per query"""
+    await vector_store.add_documents(
+        ["Docker packages applications in containers", "SQL databases store tables"],
+        [{"type": "info", "topic": "devops"}, {"type": "info", "topic": "databases"}]
+    )
+    queries = ["container images", "relational tables", "Python web framework"]
+    
+    batched = await vector_store.search_batch(queries, top_k=2)
+    
+    assert len(batched) == len(queries)
+    for query, results in zip(queries, batched):
+        single = await vector_store.search(query, top_k=2)
+        assert [r["content"] for r in results] == [r["content"] for r in single]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.parametrize("top_k", [0, -1])
+@pytest.mark.parametrize("filter_metadata", [None, {"topic": "python"}])
+async def test_search_with_no_results_requested(vector_store, top_k, filter_metadata, monkeypatch):
+    """Test non-positive top_k returns nothing without reaching any index"""
+    await vector_store.add_documents(["Python is a programming language"], [{"topic": "python"}])
+    
+    # Errors from Chroma are logged and swallowed, so record calls instead
+    queried = []
+    monkeypatch.setattr(vector_store, "collection", SimpleNamespace(query=lambda **kwargs: queried.append(kwargs)))
+    
+    assert await vector_store.search("Python", top_k=top_k, filter_metadata=filter_metadata) == []
+    assert await vector_store.search_by_embedding(
+        await vector_store.embed("Python"), top_k=top_k, filter_metadata=filter_metadata
+    ) == []
+    assert await vector_store.search_batch(
+        ["Python", "JavaScript"], top_k=top_k, filter_metadata=filter_metadata
+    ) == [[], []]
+    assert queried == []
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_index_snapshot_reused_only_while_current(vector_store):
+    """Test a saved in-memory index is memory-mapped, and ignored once a document changes"""
+    await vector_store.add_documents(["Snapshots are saved on cleanup"], [{"topic": "snapshot"}])
+    # Appends leave the snapshot for cleanup to write
+    assert vector_store._snapshot_stale
+    await asyncio.to_thread(vector_store._save_index_snapshot)
+    
+    reloaded = VectorStoreManager(collection_name=vector_store.collection_name)
+    await reloaded.initialize()
+    assert isinstance(reloaded._embeddings, np.memmap)
+    assert sorted(reloaded._rows) == sorted(vector_store._rows)
+    await reloaded.cleanup()
+    
+    # Same row count, different content
+    doc_id, _, metadata = vector_store._rows[0]
+    vector_store.collection.update(
+        ids=[doc_id],
+        documents=["Edited in place"],
+        embeddings=[np.asarray(vector_store._embeddings[0], dtype=np.float32)]
+    )
+    edited = VectorStoreManager(collection_name=vector_store.collection_name)
+    await edited.initialize()
+    assert not isinstance(edited._embeddings, np.memmap)
+    assert (doc_id, "Edited in place", metadata) in edited._rows
+    await edited.cleanup()
+
+
+@pytest.mark.skipif(vector_store_module.faiss is None, reason="faiss not installed")
+def test_int8_index_agrees_with_exact_scan(monkeypatch):
+    """Test the opt-in int8 scan finds the exact top-k and returns valid cosine scores"""
+    monkeypatch.setattr(vector_store_module.settings, "IN_MEMORY_INDEX_INT8", True)
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((500, 384)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    # Queries near stored rows, so each has a clear best match
+    queries = embeddings[:20] + 0.05 * rng.standard_normal((20, 384)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    
+    manager = VectorStoreManager()
+    manager._embeddings = embeddings
+    manager._rows = [(f"doc_{i}", f"content {i}", {}) for i in range(len(embeddings))]
+    exact = manager._search_in_memory_batch(queries, top_k=5)
+    manager._faiss_index = manager._build_faiss_index(embeddings)
+    approximate = manager._search_in_memory_batch(queries, top_k=5)
+    
+    for exact_hits, approximate_hits in zip(exact, approximate):
+        assert approximate_hits[0]['id'] == exact_hits[0]['id']
+        overlap = {hit['id'] for hit in exact_hits} & {hit['id'] for hit in approximate_hits}
+        assert len(overlap) >= 4
+        for hit in approximate_hits:
+            assert -1.0 <= hit['score'] <= 1.0
+        assert abs(approximate_hits[0]['score'] - exact_hits[0]['score']) < 0.02
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])